@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# file: tokenizer_overhead_benchmark.py
+# time: 14:20 18/10/2026
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# huggingface: https://huggingface.co/yangheng
+# google scholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# Copyright (C) 2019-2024. All Rights Reserved.
+"""
+Micro-benchmark of the per-sample overhead of the OmniGenomeTokenizer wrappers, comparing the
+explicit attribute delegation against the former __getattribute__ with a try/except
+fallback to the base tokenizer. The legacy wrapper below is a copy of the former class, it
+does not inherit from the current one, so none of the delegated attributes are shared. Both
+wrappers run the same (former) single-nucleotide __call__, so the per-sample time only
+differs by the attribute lookups; the current OmniSingleNucleotideTokenizer is listed too.
+
+    python tokenizer_overhead_benchmark.py --model yangheng/OmniGenome-52M
+"""
+import argparse
+import random
+import time
+import warnings
+
+from transformers import AutoTokenizer
+
+from omnigenome import OmniGenomeTokenizer, OmniSingleNucleotideTokenizer
+
+
+class LegacyOmniGenomeTokenizer:
+    def __init__(self, base_tokenizer=None, max_length=512, **kwargs):
+        self.metadata = {}
+
+        self.base_tokenizer = base_tokenizer
+        self.max_length = max_length
+
+        for key, value in kwargs.items():
+            self.metadata[key] = value
+
+        self.u2t = kwargs.get("u2t", False)
+        self.t2u = kwargs.get("t2u", False)
+        self.add_whitespace = kwargs.get("add_whitespace", False)
+
+    def __getattribute__(self, item):
+        try:
+            return super().__getattribute__(item)
+        except AttributeError:
+            try:
+                # getattr instead of __getattribute__, the special tokens of the recent
+                # transformers tokenizers are resolved by their __getattr__
+                return getattr(self.base_tokenizer, item)
+            except (AttributeError, RecursionError) as e:
+                raise AttributeError(
+                    f"'{self.__class__.__name__}' object has no attribute '{item}'"
+                ) from e
+
+
+class SingleNucleotideCallMixin:
+    def __call__(self, sequence, **kwargs):
+        if self.u2t:
+            sequence = "".join([seq.replace("U", "T").upper() for seq in sequence])
+        if self.t2u:
+            sequence = "".join([seq.replace("T", "U").upper() for seq in sequence])
+        if self.add_whitespace:
+            sequence = " ".join(list(sequence))
+        sequence_tokens = self.tokenize(sequence)[
+            : kwargs.get("max_length", self.max_length) - 2
+        ]
+        tokenized_inputs = {
+            "input_ids": [],
+            "attention_mask": [],
+        }
+        bos_id = (
+            self.base_tokenizer.bos_token_id
+            if self.base_tokenizer.bos_token_id is not None
+            else self.base_tokenizer.cls_token_id
+        )
+        eos_id = (
+            self.base_tokenizer.eos_token_id
+            if self.base_tokenizer.eos_token_id is not None
+            else self.base_tokenizer.sep_token_id
+        )
+        for tokens in sequence_tokens:
+            tokenized_inputs["input_ids"].append(
+                [bos_id] + self.base_tokenizer.convert_tokens_to_ids(tokens) + [eos_id]
+            )
+            tokenized_inputs["attention_mask"].append(
+                [1] * len(tokenized_inputs["input_ids"][-1])
+            )
+
+        if kwargs.get("warnings", True):
+            for i, ids in enumerate(tokenized_inputs["input_ids"]):
+                if ids.count(self.base_tokenizer.unk_token_id) / len(ids) > 0.1:
+                    warnings.warn(
+                        f"Unknown tokens are more than "
+                        f"{ids.count(self.base_tokenizer.unk_token_id) / len(ids)}% in the {i}-th sequence, "
+                        f"please check the tokenization process."
+                    )
+        max_length = max(len(ids) for ids in tokenized_inputs["input_ids"])
+        tokenized_inputs = self.base_tokenizer.pad(
+            tokenized_inputs,
+            padding=kwargs.get("padding", "max_length"),
+            max_length=min(max_length, kwargs.get("max_length", 512)),
+            return_attention_mask=kwargs.get("return_attention_mask", True),
+            return_tensors="pt",
+        )
+        return tokenized_inputs
+
+    def tokenize(self, sequence, **kwargs):
+        if isinstance(sequence, str):
+            sequences = [sequence]
+        else:
+            sequences = sequence
+
+        sequence_tokens = []
+        for i in range(len(sequences)):
+            sequence_tokens.append(list(sequences[i]))
+
+        return sequence_tokens
+
+
+class LegacyOmniSingleNucleotideTokenizer(
+    SingleNucleotideCallMixin, LegacyOmniGenomeTokenizer
+):
+    pass
+
+
+class DelegatedOmniSingleNucleotideTokenizer(
+    SingleNucleotideCallMixin, OmniGenomeTokenizer
+):
+    pass
+
+
+def timeit(func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats
+
+
+def wrapper_attribute_access(tokenizer):
+    return tokenizer.max_length, tokenizer.u2t, tokenizer.base_tokenizer
+
+
+def delegated_attribute_access(tokenizer):
+    return tokenizer.padding_side, tokenizer.pad_token_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="yangheng/OmniGenome-52M")
+    parser.add_argument("--num_samples", type=int, default=2000)
+    parser.add_argument("--seq_len", type=int, default=200)
+    args = parser.parse_args()
+
+    sequences = [
+        "".join(random.choices("ACGU", k=args.seq_len)) for _ in range(args.num_samples)
+    ]
+    base_tokenizer = AutoTokenizer.from_pretrained(args.model)
+    tokenizers = {
+        "legacy __getattribute__": LegacyOmniSingleNucleotideTokenizer(base_tokenizer),
+        "explicit delegation": DelegatedOmniSingleNucleotideTokenizer(base_tokenizer),
+        "OmniSingleNucleotideTokenizer": OmniSingleNucleotideTokenizer(base_tokenizer),
+    }
+    for name, tokenizer in tokenizers.items():
+        wrapper_time = timeit(lambda: wrapper_attribute_access(tokenizer), 100000)
+        delegated_time = timeit(lambda: delegated_attribute_access(tokenizer), 100000)
+        sample_time = (
+            timeit(
+                lambda: [
+                    tokenizer(sequence, padding="do_not_pad", max_length=512)
+                    for sequence in sequences
+                ],
+                1,
+            )
+            / args.num_samples
+        )
+        print(
+            f"{name:>30}: {wrapper_time * 1e9:8.1f} ns per 3 wrapper attributes, "
+            f"{delegated_time * 1e9:8.1f} ns per 2 delegated attributes, "
+            f"{sample_time * 1e6:8.1f} us per sample"
+        )
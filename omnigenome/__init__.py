@@ -22,6 +22,7 @@ from .src import metric as metric
 from .src import model as model
 from .src import tokenizer as tokenizer
 from .src.abc.abstract_dataset import OmniGenomeDataset
+from .src.abc.abstract_dataset import OmniGenomeIterableDataset
 from .src.abc.abstract_metric import OmniGenomeMetric
 from .src.abc.abstract_model import OmniGenomeModel
 from .src.abc.abstract_tokenizer import OmniGenomeTokenizer
@@ -29,7 +30,16 @@ from .src.dataset.omnigenome_dataset import OmniGenomeDatasetForSequenceClassifi
 from .src.dataset.omnigenome_dataset import OmniGenomeDatasetForSequenceRegression
 from .src.dataset.omnigenome_dataset import OmniGenomeDatasetForTokenClassification
 from .src.dataset.omnigenome_dataset import OmniGenomeDatasetForTokenRegression
+from .src.dataset.omnigenome_dataset import OmniGenomeIterableDatasetForSequenceClassification
+from .src.dataset.omnigenome_dataset import OmniGenomeIterableDatasetForSequenceRegression
+from .src.dataset.omnigenome_dataset import OmniGenomeIterableDatasetForTokenClassification
+from .src.dataset.omnigenome_dataset import OmniGenomeIterableDatasetForTokenRegression
 from .src.metric import ClassificationMetric, RegressionMetric, RankingMetric
+from .src.metric import (
+    StreamingMetric,
+    StreamingClassificationMetric,
+    StreamingRegressionMetric,
+)
 from .src.misc import utils as utils
 from .src.model import (
     OmniGenomeModelForSequenceClassification,
@@ -50,6 +60,7 @@ from .src.tokenizer import OmniKmersTokenizer
 from .src.tokenizer import OmniSingleNucleotideTokenizer
 from .src.trainer.hf_trainer import HFTrainer
 from .src.trainer.trainer import Trainer
+from .src.trainer.prefetcher import StructurePrefetcher
 
 from .utility.hub_utils import download_benchmark
 from .utility.hub_utils import download_model
@@ -64,6 +75,7 @@ from .src.model.module_utils import OmniGenomePooling
 
 __all__ = [
     "OmniGenomeDataset",
+    "OmniGenomeIterableDataset",
     "OmniGenomeModel",
     "OmniGenomeMetric",
     "OmniGenomeTokenizer",
@@ -96,11 +108,19 @@ __all__ = [
     "OmniGenomeDatasetForTokenRegression",
     "OmniGenomeDatasetForSequenceClassification",
     "OmniGenomeDatasetForSequenceRegression",
+    "OmniGenomeIterableDatasetForTokenClassification",
+    "OmniGenomeIterableDatasetForTokenRegression",
+    "OmniGenomeIterableDatasetForSequenceClassification",
+    "OmniGenomeIterableDatasetForSequenceRegression",
     "ClassificationMetric",
     "RegressionMetric",
     "RankingMetric",
+    "StreamingMetric",
+    "StreamingClassificationMetric",
+    "StreamingRegressionMetric",
     "Trainer",
     "HFTrainer",
+    "StructurePrefetcher",
     "AutoBenchConfig",
     "AutoBench",
     "download_benchmark",
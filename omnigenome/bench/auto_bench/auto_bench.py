@@ -165,9 +165,15 @@ class AutoBench:
                     label2id=bench_config["label2id"],
                     max_length=max_length,
                     structure_in=bench_config.get("structure_in", False),
+                    structure_inputs=bench_config.get("structure_inputs", False),
                     max_examples=bench_config.get("max_examples", None),
                     shuffle=bench_config.get("shuffle", True),
                     drop_long_seq=bench_config.get("drop_long_seq", False),
+                    num_workers=bench_config.get("num_workers", 1),
+                    cache_dir=bench_config.get("cache_dir", None),
+                    columnar=bench_config.get("columnar", False),
+                    dynamic_padding=bench_config.get("dynamic_padding", False)
+                    and not self.use_hf_trainer,
                     **_kwargs,
                 )
                 test_set = dataset_cls(
@@ -176,9 +182,15 @@ class AutoBench:
                     label2id=bench_config["label2id"],
                     max_length=max_length,
                     structure_in=bench_config.get("structure_in", False),
+                    structure_inputs=bench_config.get("structure_inputs", False),
                     max_examples=bench_config.get("max_examples", None),
                     shuffle=bench_config.get("shuffle", True),
                     drop_long_seq=bench_config.get("drop_long_seq", False),
+                    num_workers=bench_config.get("num_workers", 1),
+                    cache_dir=bench_config.get("cache_dir", None),
+                    columnar=bench_config.get("columnar", False),
+                    dynamic_padding=bench_config.get("dynamic_padding", False)
+                    and not self.use_hf_trainer,
                     **_kwargs,
                 )
                 valid_set = dataset_cls(
@@ -187,9 +199,15 @@ class AutoBench:
                     label2id=bench_config["label2id"],
                     max_length=max_length,
                     structure_in=bench_config.get("structure_in", False),
+                    structure_inputs=bench_config.get("structure_inputs", False),
                     max_examples=bench_config.get("max_examples", None),
                     shuffle=bench_config.get("shuffle", True),
                     drop_long_seq=bench_config.get("drop_long_seq", False),
+                    num_workers=bench_config.get("num_workers", 1),
+                    cache_dir=bench_config.get("cache_dir", None),
+                    columnar=bench_config.get("columnar", False),
+                    dynamic_padding=bench_config.get("dynamic_padding", False)
+                    and not self.use_hf_trainer,
                     **_kwargs,
                 )
 
@@ -299,6 +317,29 @@ class AutoBench:
                         seed=seed,
                         device=self.device,
                         autocast=self.autocast,
+                        group_by_length=bench_config.get("group_by_length", False),
+                        prefetch_structures=bench_config.get(
+                            "prefetch_structures", False
+                        ),
+                        num_threads=bench_config.get("num_threads", None),
+                        num_interop_threads=bench_config.get(
+                            "num_interop_threads", None
+                        ),
+                        save_best_state_to_disk=bench_config.get(
+                            "save_best_state_to_disk", False
+                        ),
+                        eval_batch_size=bench_config.get("eval_batch_size", None),
+                        dataloader_num_workers=bench_config.get(
+                            "dataloader_num_workers", 0
+                        ),
+                        pin_memory=bench_config.get("pin_memory", None),
+                        persistent_workers=bench_config.get("persistent_workers", None),
+                        prefetch_factor=bench_config.get("prefetch_factor", None),
+                        num_processes=bench_config.get("num_processes", 1),
+                        num_nodes=bench_config.get("num_nodes", 1),
+                        node_rank=bench_config.get("node_rank", 0),
+                        master_addr=bench_config.get("master_addr", "127.0.0.1"),
+                        master_port=bench_config.get("master_port", 29500),
                         **_kwargs,
                     )
 
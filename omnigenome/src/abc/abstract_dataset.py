@@ -6,6 +6,9 @@
 # huggingface: https://huggingface.co/yangheng
 # google scholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
 # Copyright (C) 2019-2024. All Rights Reserved.
+import copy
+import math
+import multiprocessing
 import os.path
 import random
 import warnings
@@ -16,7 +19,20 @@ import tqdm
 
 from transformers import BatchEncoding
 
-from ..misc.utils import fprint, env_meta_info, RNA2StructureCache
+from ..misc.column_store import OmniGenomeColumnStore
+from ..misc.data_reader import read_data_source
+from ..misc.dataset_cache import (
+    OmniGenomeDatasetCache,
+    data_source_fingerprint,
+    tokenizer_fingerprint,
+)
+from ..misc.utils import (
+    fprint,
+    env_meta_info,
+    sliding_window_starts,
+    check_single_nucleotide_tokenizer,
+    RNA2StructureCache,
+)
 
 
 def covert_input_to_tensor(data):
@@ -41,18 +57,305 @@ def covert_input_to_tensor(data):
     return data
 
 
+def pad_sequences(values, length=None, padding_value=0):
+    """
+    Pad (or truncate) a list of tensors along the first dimension into one preallocated tensor.
+    :param values: A list of tensors with the same dtype and trailing dimensions.
+    :param length: The target length, defaults to the length of the longest tensor.
+    :param padding_value: The value used to fill the padded positions.
+    :return: A tensor of shape (len(values), length, *trailing_dims).
+    """
+    if length is None:
+        length = max([value.size(0) for value in values])
+    padded_values = torch.full(
+        (len(values), length) + tuple(values[0].shape[1:]),
+        padding_value,
+        dtype=values[0].dtype,
+    )
+    for padded_value, value in zip(padded_values, values):
+        padded_value[: value.size(0)] = value[:length]
+    return padded_values
+
+
+def get_padding_value(key, pad_token_id, pad_value=0):
+    """
+    :return: The value used to pad the field: the pad token id for input_ids (including e.g.
+        structure_input_ids), 0 for attention_mask, -100 for labels (ignored by the loss) and pad_value otherwise.
+    """
+    if key.endswith("input_ids"):
+        return pad_token_id
+    elif key.endswith("attention_mask"):
+        return 0
+    elif "label" in key:
+        return -100
+    return pad_value
+
+
+class OmniGenomeDataCollator:
+    """
+    Collate the samples of a dynamically padded dataset. Each batch is padded to its own longest
+    sample, rounded up to a multiple of pad_to_multiple_of, instead of the longest sample in the
+    dataset. The fields with the same shape in all the samples (e.g., sequence labels) are stacked.
+    """
+
+    def __init__(self, pad_token_id, pad_to_multiple_of=8):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, samples):
+        batch = OmniGenomeDict()
+        for key in samples[0].keys():
+            values = [torch.as_tensor(sample[key]) for sample in samples]
+            if all(value.shape == values[0].shape for value in values):
+                batch[key] = torch.stack(values)
+                continue
+            length = max([value.size(0) for value in values])
+            if self.pad_to_multiple_of and length % self.pad_to_multiple_of != 0:
+                length += self.pad_to_multiple_of - length % self.pad_to_multiple_of
+            batch[key] = pad_sequences(
+                values, length, get_padding_value(key, self.pad_token_id)
+            )
+        return batch
+
+
+class LengthGroupedSampler(torch.utils.data.Sampler):
+    """
+    Batch sampler grouping samples of similar lengths. The (shuffled) indices are split into
+    buckets of num_batches_per_bucket batches, each bucket is sorted by length and cut into
+    batches, and the order of the batches is shuffled, so every batch needs little padding.
+    In distributed training, every process shuffles with the same seed and takes every
+    num_replicas-th batch, starting from its rank.
+    """
+
+    def __init__(
+        self,
+        lengths,
+        batch_size,
+        shuffle=True,
+        num_batches_per_bucket=50,
+        num_replicas=1,
+        rank=0,
+        seed=None,
+    ):
+        super(LengthGroupedSampler, self).__init__()
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = batch_size * num_batches_per_bucket
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        if self.seed is not None:
+            # The processes of distributed training must agree on the batches
+            rng = np.random.default_rng(self.seed + self.epoch)
+            permutation, shuffle = rng.permutation, rng.shuffle
+        else:
+            permutation, shuffle = np.random.permutation, random.shuffle
+        if self.shuffle:
+            indices = permutation(len(self.lengths))
+        else:
+            indices = np.arange(len(self.lengths))
+
+        batches = []
+        for i in range(0, len(indices), self.bucket_size):
+            bucket = indices[i : i + self.bucket_size]
+            bucket = bucket[np.argsort(-self.lengths[bucket], kind="stable")]
+            for j in range(0, len(bucket), self.batch_size):
+                batches.append(bucket[j : j + self.batch_size].tolist())
+
+        if self.shuffle:
+            shuffle(batches)
+        for batch in batches[self.rank :: self.num_replicas]:
+            yield batch
+
+    def __len__(self):
+        return len(
+            range(
+                self.rank,
+                math.ceil(len(self.lengths) / self.batch_size),
+                self.num_replicas,
+            )
+        )
+
+
+_worker_dataset = None
+_worker_kwargs = None
+
+
+def _init_prepare_worker(dataset, kwargs):
+    global _worker_dataset, _worker_kwargs
+    _worker_dataset = dataset
+    _worker_kwargs = kwargs
+
+
+def _prepare_shard(examples):
+    _worker_dataset._batch_tokenize(examples)
+    shard_inputs = []
+    for example in examples:
+        prepared_input = _worker_dataset.prepare_input(example, **_worker_kwargs)
+        # Send numpy arrays back to avoid sharing every small tensor through file descriptors
+        if isinstance(prepared_input, list):
+            shard_inputs.append([_to_numpy(window) for window in prepared_input])
+        else:
+            shard_inputs.append(_to_numpy(prepared_input))
+    return shard_inputs
+
+
+def _to_numpy(prepared_input):
+    return {
+        key: value.numpy() if isinstance(value, torch.Tensor) else value
+        for key, value in prepared_input.items()
+    }
+
+
+def _from_numpy(prepared_input):
+    return {
+        key: torch.from_numpy(value) if isinstance(value, np.ndarray) else value
+        for key, value in prepared_input.items()
+    }
+
+
 class OmniGenomeDict(dict):
     def __init__(self, *args, **kwargs):
         super(OmniGenomeDict, self).__init__(*args, **kwargs)
 
-    def to(self, device):
+    def to(self, device, non_blocking=False):
         for key, value in self.items():
             if isinstance(value, torch.Tensor):
-                self[key] = value.to(device)
+                self[key] = value.to(device, non_blocking=non_blocking)
         return self
 
 
-class OmniGenomeDataset(torch.utils.data.Dataset):
+class OmniGenomeDatasetMixin:
+    """
+    The preprocessing shared by OmniGenomeDataset and OmniGenomeIterableDataset, i.e., the
+    tokenization, the sliding windows and the structure inputs. The classes using it define
+    the tokenizer, max_length, window_stride and rna2structure attributes.
+    """
+
+    def prepare_input(self, instance, **kwargs):
+        raise NotImplementedError(
+            "The prepare_input() function should be implemented for your dataset."
+        )
+
+    def _batch_tokenize(self, examples, batch_size=1024):
+        """
+        Tokenize the sequences of the examples in batches with tokenizer.batch_encode(), the
+        results are picked up by _tokenize() when the examples are prepared one by one.
+        """
+        self._tokenized_sequences = {}
+        sequences = list(
+            {
+                example["sequence"]: None
+                for example in examples
+                if isinstance(example, dict) and isinstance(example.get("sequence"), str)
+            }
+        )
+        try:
+            for i in range(0, len(sequences), batch_size):
+                batch_sequences = sequences[i : i + batch_size]
+                tokenized_inputs = self.tokenizer.batch_encode(
+                    batch_sequences,
+                    truncation=True,
+                    max_length=self.max_length,
+                    return_tensors="pt",
+                )
+                lengths = tokenized_inputs["attention_mask"].sum(dim=1).tolist()
+                left_padding = self.tokenizer.base_tokenizer.padding_side == "left"
+                for j, (sequence, length) in enumerate(zip(batch_sequences, lengths)):
+                    self._tokenized_sequences[sequence] = {
+                        col: value[j, -length:] if left_padding else value[j, :length]
+                        for col, value in tokenized_inputs.items()
+                    }
+        except Exception as e:
+            warnings.warn(f"Failed to tokenize the sequences in batches due to {e}.")
+            self._tokenized_sequences = {}
+
+    def _tokenize(self, sequence):
+        """
+        Tokenize a sequence without padding, reusing the result of _batch_tokenize() if any.
+        :return: A dict of 1-D tensors, e.g., input_ids and attention_mask.
+        """
+        tokenized_sequences = self.__dict__.get("_tokenized_sequences", None)
+        if tokenized_sequences and sequence in tokenized_sequences:
+            return dict(tokenized_sequences[sequence])
+        tokenized_inputs = self.tokenizer(
+            sequence,
+            padding="do_not_pad",
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt",
+        )
+        for col in tokenized_inputs:
+            tokenized_inputs[col] = tokenized_inputs[col].squeeze()
+        return tokenized_inputs
+
+    def _add_structure_inputs(self, data, batch_size=1024):
+        """
+        Fold the sequences of the tokenized samples and add their tokenized structures as the
+        structure_input_ids and structure_attention_mask fields, which the *With2DStructure
+        models use instead of decoding and folding each batch in the forward pass.
+        """
+        base_tokenizer = getattr(self.tokenizer, "base_tokenizer", self.tokenizer)
+        for i in range(0, len(data), batch_size):
+            data_items = data[i : i + batch_size]
+            sequences = base_tokenizer.batch_decode(
+                [data_item["input_ids"] for data_item in data_items],
+                skip_special_tokens=True,
+            )
+            sequences = [seq.replace(" ", "") for seq in sequences]
+            structures = self.rna2structure.fold(sequences)
+            if not isinstance(structures, list):
+                structures = [structures]
+
+            # Pad the structures to the length of the input_ids of each sample
+            groups = {}
+            for data_item, structure in zip(data_items, structures):
+                length = len(data_item["input_ids"])
+                groups.setdefault(length, []).append((data_item, structure))
+            for length, group in groups.items():
+                tokenized_struct = base_tokenizer(
+                    [structure for _, structure in group],
+                    padding="max_length",
+                    max_length=length,
+                    truncation=True,
+                    return_tensors="pt",
+                    add_special_tokens=True,
+                )
+                for j, (data_item, _) in enumerate(group):
+                    for key, value in tokenized_struct.items():
+                        data_item[f"structure_{key}"] = value[j].to(
+                            data_item["input_ids"].dtype
+                        )
+
+    def _sliding_windows(self, sequence, labels=None):
+        """
+        Split a sequence longer than the model context, and its token labels, into overlapping
+        windows of max_length - 2 tokens (leaving room for the special tokens).
+        :param sequence: The sequence of nucleotides.
+        :param labels: The token labels aligned with the sequence, optional.
+        :return: A list of instances, i.e., dicts with the "sequence" and "labels" keys.
+        """
+        window_size = self.max_length - 2
+        stride = self.window_stride if self.window_stride else window_size // 2
+        return [
+            {
+                "sequence": sequence[start : start + window_size],
+                "labels": labels[start : start + window_size]
+                if labels is not None
+                else None,
+            }
+            for start in sliding_window_starts(len(sequence), window_size, stride)
+        ]
+
+
+class OmniGenomeDataset(OmniGenomeDatasetMixin, torch.utils.data.Dataset):
     def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
         super(OmniGenomeDataset, self).__init__()
         self.metadata = env_meta_info()
@@ -61,7 +364,23 @@ class OmniGenomeDataset(torch.utils.data.Dataset):
         self.shuffle = kwargs.get("shuffle", True)
         self.structure_in = kwargs.get("structure_in", False)
         self.drop_long_seq = kwargs.get("drop_long_seq", False)
-        if self.structure_in and not hasattr(self, "rna2structure"):
+        # Store the tokenized samples in an array-backed OmniGenomeColumnStore
+        self.columnar = kwargs.get("columnar", False)
+        # Store the integer fields in the smallest fitting dtypes (e.g., uint8 input_ids), or
+        # in their original dtypes, so the samples are indexed as zero-copy views
+        self.columnar_compact = kwargs.get("columnar_compact", True)
+        # Pad each batch to its own longest sample instead of padding the whole dataset
+        self.dynamic_padding = kwargs.get("dynamic_padding", False)
+        # Split the long sequences into overlapping windows (token-level datasets)
+        self.sliding_window = kwargs.get("sliding_window", False)
+        self.window_stride = kwargs.get("window_stride", None)
+        if self.sliding_window:
+            check_single_nucleotide_tokenizer(self.tokenizer)
+        # Carry the tokenized secondary structures for the *With2DStructure models
+        self.structure_inputs = kwargs.get("structure_inputs", False)
+        if (self.structure_in or self.structure_inputs) and not hasattr(
+            self, "rna2structure"
+        ):
             self.rna2structure = RNA2StructureCache()
 
         if self.label2id is not None:
@@ -87,76 +406,143 @@ class OmniGenomeDataset(torch.utils.data.Dataset):
         self.examples = []
         self.data = []
 
-        if data_source is not None:
+        self.data_collator = None
+        if self.dynamic_padding:
+            if hasattr(self.tokenizer, "pad_token_id"):
+                pad_token_id = self.tokenizer.pad_token_id
+            else:
+                pad_token_id = self.tokenizer.base_tokenizer.pad_token_id
+            self.data_collator = OmniGenomeDataCollator(pad_token_id)
+
+        self.dataset_cache = None
+        cache_dir = kwargs.get("cache_dir", None)
+        if data_source is not None and cache_dir:
+            if self.shuffle and kwargs.get("max_examples", None) is not None:
+                fprint(
+                    "Detected shuffle=True and max_examples, the dataset cache is disabled "
+                    "because the examples are randomly selected."
+                )
+            else:
+                self.dataset_cache = OmniGenomeDatasetCache(
+                    cache_dir if isinstance(cache_dir, str) else None
+                )
+                self._cache_fingerprint = self._fingerprint(data_source, **kwargs)
+
+        if self.dataset_cache is not None and self._load_from_cache():
+            fprint(self.get_inputs_length())
+        elif data_source is not None:
             fprint(f"Loading data from {data_source}...")
             self.load_data_source(data_source, **kwargs)
             self._preprocessing()
 
-            for example in tqdm.tqdm(self.examples):
-                try:
-                    self.max_length = min(
-                        self.max_length,
-                        max(self.max_length, len(example["sequence"]) - 2),
-                    )
-                    if self.max_length % 8 != 0:
-                        self.max_length = self.max_length + 8 - self.max_length % 8
-                except KeyError:
-                    pass
-                self.tokenizer.max_length = self.max_length
-                prepared_input = self.prepare_input(example, **kwargs)
-
-                if self.drop_long_seq and len(prepared_input["input_ids"]) > self.max_length:
-                    print(f"Dropping sequence {example['sequence']} due to length > {self.max_length}")
-                else:
-                    self.data.append(prepared_input)
-
-            # prepared_inputs = []
-            # for example in tqdm.tqdm(self.examples):
-            #     try:
-            #         self.max_length = min(
-            #             self.max_length,
-            #             max(self.max_length, len(example["sequence"]) - 2),
-            #         )
-            #     except KeyError:
-            #         pass
-            #     self.tokenizer.max_length = self.max_length
-            # try:
-            #     # fprint("Paralleling the data preparation process...")
-            #     # from joblib import Parallel, delayed
-            #     # prepared_inputs = Parallel(n_jobs=os.cpu_count(), verbose=50)(
-            #     #     delayed(self.prepare_input)(example, **kwargs) for example in self.examples
-            #     # )
-            #     import time
-            #     time_start = time.time()
-            #     from pathos.multiprocessing import ProcessingPool as Pool
-            #     pool = Pool()
-            #     results = pool.map(self.prepare_input, self.examples)
-            #     pool.close()
-            #     pool.join()
-            #     time_end = time.time()
-            #     fprint(f"Time cost: {time_end - time_start}s")
-            # except:
-            #     fprint("pip install joblib to enable parallel data preparation.")
-            #     for example in tqdm.tqdm(self.examples):
-            #         prepared_inputs.append(self.prepare_input(example, **kwargs))
-            #
-            # for prepared_input in prepared_inputs:
-            #     if self.drop_long_seq and len(prepared_input["input_ids"]) > self.max_length:
-            #         fprint(f"Dropping sequence due to length > {self.max_length}")
-            #     else:
-            #         self.data.append(prepared_input)
+            # The max_length is rounded up to a multiple of 8 for the sequence inputs
+            if any("sequence" in example for example in self.examples):
+                if self.max_length % 8 != 0:
+                    self.max_length = self.max_length + 8 - self.max_length % 8
+            self.tokenizer.max_length = self.max_length
+
+            prepared_inputs = self._prepare_inputs(self.examples, **kwargs)
+            for example, prepared_input in zip(self.examples, prepared_inputs):
+                # The windowed datasets prepare a list of inputs for each long sequence
+                if not isinstance(prepared_input, list):
+                    prepared_input = [prepared_input]
+                for window_input in prepared_input:
+                    if self.drop_long_seq and len(window_input["input_ids"]) > self.max_length:
+                        print(f"Dropping sequence {example['sequence']} due to length > {self.max_length}")
+                    else:
+                        self.data.append(window_input)
 
             self._postprocessing()
 
             if self.examples:
                 self.data = covert_input_to_tensor(self.data)
-                self._pad_and_truncate()
+                if self.dynamic_padding:
+                    self._truncate()
+                else:
+                    self._pad_and_truncate()
+                if self.structure_inputs:
+                    self._add_structure_inputs(self.data)
+                if self.columnar:
+                    self._to_column_store()
                 fprint(self.get_inputs_length())
                 fprint(f"Preview of the first two samples in the dataset:")
-                for sample in self.data[:2]:
-                    print(sample)
+                for idx in range(min(len(self.data), 2)):
+                    print(self.data[idx])
+
+                if self.dataset_cache is not None:
+                    self.dataset_cache.save(
+                        self._cache_fingerprint, self.data, max_length=self.max_length
+                    )
+
+        if hasattr(self, "rna2structure"):
+            # The structures are only folded while preparing the data, release the workers
+            self.rna2structure.close()
+
+    def _fingerprint(self, data_source, **kwargs):
+        return OmniGenomeDatasetCache.fingerprint(
+            dataset_cls=self.__class__.__name__,
+            omnigenome_version=self.metadata["omnigenome_version"],
+            data_source=data_source_fingerprint(
+                data_source, kwargs.get("cache_hash", False)
+            ),
+            tokenizer=tokenizer_fingerprint(self.tokenizer),
+            max_length=self.max_length,
+            label2id=self.label2id,
+            structure_in=self.structure_in,
+            drop_long_seq=self.drop_long_seq,
+            dynamic_padding=self.dynamic_padding,
+            sliding_window=self.sliding_window,
+            window_stride=self.window_stride,
+            structure_inputs=self.structure_inputs,
+            columns=kwargs.get("columns", None),
+            max_examples=kwargs.get("max_examples", None),
+        )
+
+    def _load_from_cache(self):
+        cached = self.dataset_cache.load(self._cache_fingerprint)
+        if cached is None:
+            return False
+
+        store, meta = cached
+        if self.columnar:
+            self.data = store
+        else:
+            self.data = [store.get(i) for i in range(len(store))]
+            if self.shuffle is True:
+                random.shuffle(self.data)
+        self.max_length = meta["max_length"]
+        self.tokenizer.max_length = self.max_length
+        fprint(
+            f"Loaded {len(self.data)} samples from the dataset cache "
+            f"{self.dataset_cache.cache_dir}/{self._cache_fingerprint}"
+        )
+        return True
+
+    def _pad_values(self):
+        if hasattr(self.tokenizer, "pad_token_id"):
+            pad_token_id = self.tokenizer.pad_token_id
+        else:
+            pad_token_id = self.tokenizer.base_tokenizer.pad_token_id
+        return {
+            key: get_padding_value(key, pad_token_id) for key in self.data[0].keys()
+        }
+
+    def _to_column_store(self):
+        for data_item in self.data:
+            if not all(isinstance(value, torch.Tensor) for value in data_item.values()):
+                fprint("The dataset contains non-tensor fields, keep the list storage.")
+                self.columnar = False
+                return
+        store = OmniGenomeColumnStore.from_samples(
+            self.data, pad_values=self._pad_values(), compact=self.columnar_compact
+        )
+        fprint(f"Stored {len(store)} samples in {store.nbytes / 1024 ** 2:.2f} MB columns")
+        self.data = store
 
     def to(self, device):
+        if isinstance(self.data, OmniGenomeColumnStore):
+            # The columns stay in host memory, the batches are moved to the device instead
+            return self
         for data_item in self.data:
             for key, value in data_item.items():
                 if isinstance(value, torch.Tensor):
@@ -168,88 +554,44 @@ class OmniGenomeDataset(torch.utils.data.Dataset):
             pad_token_id = self.tokenizer.pad_token_id
         else:
             pad_token_id = self.tokenizer.base_tokenizer.pad_token_id
-        max_length = min(
-            max(
-                max(
-                    [
-                        torch.sum(data_item["input_ids"] != pad_token_id)
-                        for data_item in self.data
-                    ]
-                ),
-                max(
-                    [
-                        data_item["labels"].shape[0]
-                        if data_item["labels"].shape
-                        else -1
-                        for data_item in self.data
-                    ]
-                ),
-            ),
-            self.max_length,
+
+        columns = {
+            key: [
+                data_item[key]
+                if isinstance(data_item[key], torch.Tensor)
+                else torch.tensor(np.array(data_item[key]))
+                for data_item in self.data
+            ]
+            for key in self.data[0].keys()
+        }
+        # Count the non-padding tokens of all the samples in one pass
+        input_ids = pad_sequences(columns["input_ids"], padding_value=pad_token_id)
+        max_seq_length = int((input_ids != pad_token_id).sum(dim=1).max())
+        max_label_length = max(
+            [label.shape[0] if label.shape else -1 for label in columns["labels"]]
         )
+        max_length = min(max(max_seq_length, max_label_length), self.max_length)
         label_padding_length = self._max_labels_length()
 
+        for key, values in columns.items():
+            if any(value.dim() == 0 for value in values):
+                if "label" in key:
+                    continue
+                raise ValueError(f"Cannot pad the scalar values of '{key}'.")
+            padded_values = pad_sequences(
+                values,
+                length=label_padding_length if "label" in key else max_length,
+                padding_value=get_padding_value(key, pad_token_id, pad_value),
+            )
+            for data_item, padded_value in zip(self.data, padded_values):
+                data_item[key] = padded_value
+
+    def _truncate(self):
+        # Only truncate the inputs, the padding is done per batch by the data collator
         for data_item in self.data:
             for key, value in data_item.items():
-                value = torch.tensor(np.array(value))
-                dtype = value.dtype
-                if "label" in key:
-                    if value.dim() == 0:
-                        padding_length = 0
-                    else:
-                        padding_length = label_padding_length - value.size(0)
-                else:
-                    padding_length = max_length - value.size(0)
-                if isinstance(value, torch.Tensor) and value.dim() == 2:
-                    if padding_length > 0:
-                        if key == "input_ids":
-                            if hasattr(self.tokenizer, "pad_token_id"):
-                                _pad_value = self.tokenizer.pad_token_id * torch.ones(
-                                    (padding_length, value.size(1))
-                                )
-                            else:
-                                _pad_value = (
-                                    self.tokenizer.base_tokenizer.pad_token_id
-                                    * torch.ones((padding_length, value.size(1)))
-                                )
-                        elif key == "attention_mask":
-                            _pad_value = torch.zeros((padding_length, value.size(1)))
-                        elif "label" in key:
-                            _pad_value = -100 * torch.ones(
-                                (label_padding_length, value.size(1))
-                            )
-                        else:
-                            _pad_value = pad_value * torch.ones(
-                                (padding_length, value.size(1))
-                            )
-                        data_item[key] = torch.cat([value, _pad_value], dim=0)
-                    elif padding_length < 0:
-                        data_item[key] = value[:max_length]
-                    data_item[key] = data_item[key].to(dtype)
-
-                elif isinstance(value, torch.Tensor) and len(value.shape) == 1:
-                    if padding_length > 0:
-                        if key == "input_ids":
-                            if hasattr(self.tokenizer, "pad_token_id"):
-                                _pad_value = self.tokenizer.pad_token_id * torch.ones(
-                                    (padding_length,)
-                                )
-                            else:
-                                _pad_value = (
-                                    self.tokenizer.base_tokenizer.pad_token_id
-                                    * torch.ones((padding_length,))
-                                )
-                        elif key == "attention_mask":
-                            _pad_value = torch.zeros((padding_length,))
-                        elif "label" in key:
-                            _pad_value = -100 * torch.ones((padding_length,))
-                        else:
-                            _pad_value = pad_value * torch.ones((padding_length,))
-                        data_item[key] = torch.cat([value, _pad_value], dim=0)
-                    elif padding_length < 0:
-                        data_item[key] = value[:max_length]
-
-                    data_item[key] = data_item[key].to(dtype)
+                if "label" not in key and value.dim() > 0:
+                    data_item[key] = value[: self.max_length]
 
     def load_data_source(self, data_source, **kwargs):
         examples = []
@@ -258,34 +600,8 @@ class OmniGenomeDataset(torch.utils.data.Dataset):
             data_source = [data_source]
 
         for data_source in data_source:
-            if data_source.endswith(".csv"):
-                import pandas as pd
-
-                df = pd.read_csv(data_source)
-                for i in range(len(df)):
-                    examples.append(df.iloc[i].to_dict())
-            elif data_source.endswith(".json"):
-                import json
-
-                with open(data_source, "r", encoding="utf8") as f:
-                    lines = f.readlines()
-                for i in range(len(lines)):
-                    lines[i] = json.loads(lines[i])
-                for line in lines:
-                    examples.append(line)
-            elif data_source.endswith(".parquet"):
-                import pandas as pd
-
-                df = pd.read_parquet(data_source)
-                for i in range(len(df)):
-                    examples.append(df.iloc[i].to_dict())
-            elif data_source.endswith(".txt") or data_source.endswith(".dat"):
-                with open(data_source, "r", encoding="utf8") as f:
-                    lines = f.readlines()
-                for line in lines:
-                    examples.append({"text": line.strip()})
-            else:
-                raise Exception("Unknown file format.")
+            for chunk in read_data_source(data_source, columns=kwargs.get("columns", None)):
+                examples.extend(chunk)
 
         fprint(f"Loaded {len(examples)} examples from {data_source}")
 
@@ -300,10 +616,56 @@ class OmniGenomeDataset(torch.utils.data.Dataset):
         self.examples = examples
         return examples
 
-    def prepare_input(self, instance, **kwargs):
-        raise NotImplementedError(
-            "The prepare_input() function should be implemented for your dataset."
-        )
+    def _prepare_inputs(self, examples, **kwargs):
+        """
+        Prepare the inputs of the examples, optionally sharded across a process pool.
+        :param examples: The preprocessed examples.
+        :param kwargs: The num_workers in kwargs is the number of worker processes,
+            None or a value < 1 uses all the CPU cores.
+        :return: The prepared inputs in the same order as the examples.
+        """
+        num_workers = kwargs.get("num_workers", 1)
+        if num_workers is None or num_workers < 1:
+            num_workers = os.cpu_count()
+        num_workers = min(num_workers, max(len(examples) // 64, 1))
+
+        if num_workers == 1:
+            self._batch_tokenize(examples)
+            prepared_inputs = [
+                self.prepare_input(example, **kwargs)
+                for example in tqdm.tqdm(examples)
+            ]
+            self._tokenized_sequences = {}
+            return prepared_inputs
+
+        fprint(f"Preparing the inputs with {num_workers} worker processes...")
+        # Every worker receives its own copy of the dataset (and tokenizer) without the examples
+        worker_dataset = copy.copy(self)
+        worker_dataset.examples = []
+        worker_dataset.data = []
+        worker_dataset.__dict__.pop("rna2structure", None)
+
+        shard_size = math.ceil(len(examples) / (num_workers * 4))
+        shards = [
+            examples[i : i + shard_size] for i in range(0, len(examples), shard_size)
+        ]
+        prepared_inputs = []
+        with multiprocessing.Pool(
+            num_workers,
+            initializer=_init_prepare_worker,
+            initargs=(worker_dataset, kwargs),
+        ) as pool:
+            for shard_inputs in tqdm.tqdm(
+                pool.imap(_prepare_shard, shards), total=len(shards)
+            ):
+                for prepared_input in shard_inputs:
+                    if isinstance(prepared_input, list):
+                        prepared_inputs.append(
+                            [_from_numpy(window) for window in prepared_input]
+                        )
+                    else:
+                        prepared_inputs.append(_from_numpy(prepared_input))
+        return prepared_inputs
 
     def _preprocessing(self):
         for idx, ex in enumerate(self.examples):
@@ -342,30 +704,61 @@ class OmniGenomeDataset(torch.utils.data.Dataset):
         return len(self.data)
 
     def __getitem__(self, idx):
+        if isinstance(self.data, OmniGenomeColumnStore):
+            # A list or a slice of indices is fetched as a whole batch from the columns
+            if isinstance(idx, (int, np.integer)):
+                return OmniGenomeDict(self.data.get(idx))
+            return OmniGenomeDict(
+                self.data.batch(idx, pad_to_multiple_of=8 if self.dynamic_padding else None)
+            )
         # convert the data item to a omnigenome dict
         return OmniGenomeDict(self.data[idx])
 
     def sample(self, n=1):
+        if isinstance(self.data, OmniGenomeColumnStore):
+            return [self.data.get(i) for i in random.sample(range(len(self.data)), n)]
         return random.sample(self.data, n)
 
     def get_column(self, column_name):
+        if isinstance(self.data, OmniGenomeColumnStore):
+            return self.data.column(column_name)
         return [data_item[column_name] for data_item in self.data]
 
     def get_labels(self):
         return set(self.get_column("labels"))
 
+    def get_sequence_lengths(self):
+        """
+        :return: The number of non-padding tokens of each sample, e.g., for a LengthGroupedSampler.
+        """
+        if hasattr(self.tokenizer, "pad_token_id"):
+            pad_token_id = self.tokenizer.pad_token_id
+        else:
+            pad_token_id = self.tokenizer.base_tokenizer.pad_token_id
+        if isinstance(self.data, OmniGenomeColumnStore):
+            if "input_ids" in self.data.offsets:
+                return np.diff(self.data.offsets["input_ids"])
+            return (self.data.columns["input_ids"] != pad_token_id).sum(axis=1)
+        return np.array(
+            [int(torch.sum(data_item["input_ids"] != pad_token_id)) for data_item in self.data]
+        )
+
     def get_inputs_length(self):
         if hasattr(self.tokenizer, "pad_token_id"):
             pad_token_id = self.tokenizer.pad_token_id
         else:
             pad_token_id = self.tokenizer.base_tokenizer.pad_token_id
         length = {}
+        if isinstance(self.data, OmniGenomeColumnStore):
+            data = [self.data.view(i) for i in range(len(self.data))]
+        else:
+            data = self.data
         all_seq_lengths = [
-            torch.sum(data_item["input_ids"] != pad_token_id) for data_item in self.data
+            torch.sum(data_item["input_ids"] != pad_token_id) for data_item in data
         ]
         all_label_lengths = [
             data_item["labels"].shape[0] if data_item["labels"].shape else 1
-            for data_item in self.data
+            for data_item in data
         ]
         length["avg_seq_len"] = np.mean(all_seq_lengths)
         length["max_seq_len"] = np.max(all_seq_lengths)
@@ -382,5 +775,197 @@ class OmniGenomeDataset(torch.utils.data.Dataset):
             return 1
 
     def __iter__(self):
-        for data_item in self.data:
+        for idx in range(len(self.data)):
+            yield self[idx]
+
+
+class OmniGenomeIterableDataset(
+    OmniGenomeDatasetMixin, torch.utils.data.IterableDataset
+):
+    """
+    Streaming sibling of OmniGenomeDataset. The data source is read incrementally in chunks,
+    every example is tokenized on the fly by prepare_input(), and shuffling is done through a
+    bounded shuffle buffer, so the memory footprint does not grow with the size of the corpus.
+    Each sample is padded (or truncated) to max_length, hence the default collate function of
+    the DataLoader can be used directly.
+    """
+
+    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
+        super(OmniGenomeIterableDataset, self).__init__()
+        self.metadata = env_meta_info()
+        self.tokenizer = tokenizer
+        self.data_source = (
+            data_source if isinstance(data_source, list) else [data_source]
+        )
+        self.label2id = kwargs.get("label2id", None)
+        self.shuffle = kwargs.get("shuffle", True)
+        self.shuffle_buffer_size = kwargs.get("shuffle_buffer_size", 10000)
+        self.chunk_size = kwargs.get("chunk_size", 1000)
+        self.columns = kwargs.get("columns", None)
+        self.max_examples = kwargs.get("max_examples", None)
+        self.structure_in = kwargs.get("structure_in", False)
+        self.drop_long_seq = kwargs.get("drop_long_seq", False)
+        self.dynamic_padding = kwargs.get("dynamic_padding", False)
+        self.sliding_window = kwargs.get("sliding_window", False)
+        self.window_stride = kwargs.get("window_stride", None)
+        if self.sliding_window:
+            check_single_nucleotide_tokenizer(self.tokenizer)
+        self.structure_inputs = kwargs.get("structure_inputs", False)
+        self.kwargs = kwargs
+        if (self.structure_in or self.structure_inputs) and not hasattr(
+            self, "rna2structure"
+        ):
+            self.rna2structure = RNA2StructureCache()
+
+        if self.label2id is not None:
+            self.id2label = {v: k for k, v in self.label2id.items()}
+
+        if max_length is not None:
+            fprint(
+                f"Detected max_length={max_length} in the dataset, using it as the max_length."
+            )
+            self.max_length = max_length
+        elif (
+            hasattr(self.tokenizer, "max_length")
+            and self.tokenizer.max_length is not None
+        ):
+            fprint(
+                f"Detected max_length={self.tokenizer.max_length} from the tokenizer."
+            )
+            self.max_length = self.tokenizer.max_length
+        else:
+            raise ValueError("max_length must be provided in the dataset or tokenizer.")
+
+        if self.max_length % 8 != 0:
+            self.max_length = self.max_length + 8 - self.max_length % 8
+        self.tokenizer.max_length = self.max_length
+
+        self.data_collator = None
+        if self.dynamic_padding:
+            if hasattr(self.tokenizer, "pad_token_id"):
+                pad_token_id = self.tokenizer.pad_token_id
+            else:
+                pad_token_id = self.tokenizer.base_tokenizer.pad_token_id
+            self.data_collator = OmniGenomeDataCollator(pad_token_id)
+
+    def _iter_raw_chunks(self):
+        for data_source in self.data_source:
+            fprint(f"Streaming data from {data_source}...")
+            for chunk in read_data_source(
+                data_source, columns=self.columns, chunk_size=self.chunk_size
+            ):
+                yield chunk
+
+    def _preprocessing(self, examples):
+        for example in examples:
+            if "seq" in example:  # For the RNA or DNA stored in the "seq" field
+                example["sequence"] = example.pop("seq")
+            if "text" in example:  # For the RNA or DNA stored in the "text" field
+                example["sequence"] = example.pop("text")
+            if "sequence" not in example:
+                warnings.warn("The 'sequence' field is missing in the raw dataset.")
+        if self.structure_in and examples and "sequence" in examples[0]:
+            sequences = [ex["sequence"] for ex in examples]
+            structures = self.rna2structure.fold(sequences)
+            if not isinstance(structures, list):
+                structures = [structures]
+            for example, sequence, structure in zip(examples, sequences, structures):
+                example["sequence"] = f"{sequence}{self.tokenizer.eos_token}{structure}"
+        return examples
+
+    def _postprocessing(self, prepared_input):
+        if "label" in prepared_input:
+            prepared_input["labels"] = prepared_input.pop("label")
+        assert (
+            "labels" in prepared_input
+        ), "The 'labels' field is required in the tokenized dataset."
+        return prepared_input
+
+    def _pad_and_truncate(self, data_item, pad_value=0):
+        if hasattr(self.tokenizer, "pad_token_id"):
+            pad_token_id = self.tokenizer.pad_token_id
+        else:
+            pad_token_id = self.tokenizer.base_tokenizer.pad_token_id
+        for key, value in data_item.items():
+            if not isinstance(value, torch.Tensor):
+                value = torch.tensor(np.array(value))
+            if value.dim() == 0:
+                data_item[key] = value
+                continue
+            padding_length = self.max_length - value.size(0)
+            if padding_length > 0 and not self.dynamic_padding:
+                _pad_value = torch.full(
+                    (padding_length,) + tuple(value.shape[1:]),
+                    get_padding_value(key, pad_token_id, pad_value),
+                    dtype=value.dtype,
+                )
+                value = torch.cat([value, _pad_value], dim=0)
+            elif padding_length < 0:
+                value = value[: self.max_length]
+            data_item[key] = value
+        return data_item
+
+    def _iter_prepared_inputs(self):
+        worker_info = torch.utils.data.get_worker_info()
+        num_workers = worker_info.num_workers if worker_info is not None else 1
+        worker_id = worker_info.id if worker_info is not None else 0
+        if torch.distributed.is_available() and torch.distributed.is_initialized():
+            # Shard the examples across the processes of distributed training as well
+            worker_id += torch.distributed.get_rank() * num_workers
+            num_workers *= torch.distributed.get_world_size()
+
+        try:
+            num_examples = 0
+            for chunk in self._iter_raw_chunks():
+                if self.max_examples is not None:
+                    chunk = chunk[: max(self.max_examples - num_examples, 0)]
+                if not chunk:
+                    break
+                # Shard the examples across the DataLoader workers
+                examples = [
+                    example
+                    for idx, example in enumerate(chunk, start=num_examples)
+                    if idx % num_workers == worker_id
+                ]
+                num_examples += len(chunk)
+                examples = self._preprocessing(examples)
+                self._batch_tokenize(examples)
+                data_items = []
+                for example in examples:
+                    prepared_input = self.prepare_input(example, **self.kwargs)
+                    if not isinstance(prepared_input, list):
+                        prepared_input = [prepared_input]
+                    for window_input in prepared_input:
+                        if (
+                            self.drop_long_seq
+                            and len(window_input["input_ids"]) > self.max_length
+                        ):
+                            continue
+                        window_input = self._postprocessing(dict(window_input))
+                        data_items.append(self._pad_and_truncate(window_input))
+                if self.structure_inputs:
+                    self._add_structure_inputs(data_items)
+                yield from data_items
+        finally:
+            if hasattr(self, "rna2structure"):
+                # Release the folding workers at the end of each pass over the data
+                self.rna2structure.close()
+
+    def __iter__(self):
+        if not self.shuffle:
+            for data_item in self._iter_prepared_inputs():
+                yield OmniGenomeDict(data_item)
+            return
+
+        shuffle_buffer = []
+        for data_item in self._iter_prepared_inputs():
+            if len(shuffle_buffer) < self.shuffle_buffer_size:
+                shuffle_buffer.append(data_item)
+                continue
+            idx = random.randint(0, len(shuffle_buffer) - 1)
+            yield OmniGenomeDict(shuffle_buffer[idx])
+            shuffle_buffer[idx] = data_item
+
+        random.shuffle(shuffle_buffer)
+        for data_item in shuffle_buffer:
             yield OmniGenomeDict(data_item)
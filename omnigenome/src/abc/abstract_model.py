@@ -8,15 +8,19 @@
 # Copyright (C) 2019-2024. All Rights Reserved.
 import json
 import os
+import queue
 import shutil
+import threading
 import warnings
 import inspect
 import findfile
+import numpy as np
 import torch
 from transformers import AutoModel, AutoConfig, AutoTokenizer, BatchEncoding
 
 from ..misc.utils import RNA2StructureCache
-from ..misc.utils import fprint, env_meta_info
+from ..misc.utils import fprint, env_meta_info, sliding_window_starts
+from ..misc.utils import check_single_nucleotide_tokenizer
 from ...src.model.module_utils import InteractingAttention
 
 
@@ -100,6 +104,8 @@ class OmniGenomeModel(torch.nn.Module):
 
         self.dropout = torch.nn.Dropout(kwargs.get("dropout", 0.0))
         self.activation = torch.nn.Tanh()
+        # The resolved calling conventions of the backbone, see last_hidden_state_forward()
+        self._backbone_dispatchers = {}
 
     def last_hidden_state_forward(self, inputs):
         """
@@ -107,10 +113,6 @@ class OmniGenomeModel(torch.nn.Module):
         :return: The last hidden state of the model and the secondary structure information if ss is not None
         """
         model = self.model
-        input_mapping = {}
-
-        # Determine the input parameter names of the model's forward method
-        forward_params = inspect.signature(model.forward).parameters
 
         if isinstance(inputs, tuple):
             input_ids = inputs[0]
@@ -140,27 +142,14 @@ class OmniGenomeModel(torch.nn.Module):
             raise ValueError(
                 f"The inputs should be a tuple, BatchEncoding or a dictionary-like object, got {type(inputs)}.")
 
-        # Map the inputs to the forward method parameters
-        for param in forward_params:
-            if param in inputs:
-                input_mapping[param] = inputs[param]
-
-        try:
-            if "2DStructure" in self.metadata["model_name"]:
-                outputs = self._structure_hidden_state_forward(inputs)
-            else:
-                outputs = model(**input_mapping, output_hidden_states=True)
-        except Exception as e:
-            try:
-                outputs = model(input_ids=input_ids, output_hidden_states=True)
-            except Exception as e:
-                if 'x' in forward_params:
-                    try:
-                        outputs = model(x=input_ids)
-                    except Exception as e:
-                        raise RuntimeError(f"Failed to get the last hidden state from the model, got error: {e}")
-                else:
-                    raise ValueError("The model does not accept 'x' as input.")
+        # The calling convention of the backbone is resolved at the first batch of each input
+        # type and reused, so each forward pass runs exactly one backbone call
+        input_type = "mapping" if isinstance(inputs, (dict, BatchEncoding)) else "tensor"
+        dispatcher = self._backbone_dispatchers.get(input_type, (None, None))
+        if dispatcher[0] is model:
+            outputs = dispatcher[1](inputs, input_ids)
+        else:
+            outputs = self._resolve_backbone_dispatcher(inputs, input_ids, input_type)
 
         if not hasattr(outputs, "last_hidden_state"):
             warnings.warn(f"last_hidden_state not found in the outputs from the {model.__class__.__name__} model.")
@@ -179,6 +168,65 @@ class OmniGenomeModel(torch.nn.Module):
 
         return last_hidden_state
 
+    def _resolve_backbone_dispatcher(self, inputs, input_ids, input_type):
+        """
+        Find the calling convention of the backbone, i.e., the keyword mapping of the inputs
+        to the parameters of its forward(), the input_ids only, or the x= style of the
+        Hyena/Caduceus-like models, and cache it for the input type. The next convention is
+        only tried if the backbone rejects the arguments with a TypeError, any other error,
+        e.g., running out of memory, is raised and nothing is cached.
+        :return: The outputs of the backbone for the inputs.
+        """
+        model = self.model
+        self._backbone_forward_params = [
+            param
+            for param in inspect.signature(model.forward).parameters
+            if param != "output_hidden_states"
+        ]
+        if "2DStructure" in self.metadata["model_name"]:
+            candidates = [self._call_backbone_with_structure]
+        elif input_type == "mapping":
+            candidates = [self._call_backbone_with_keywords]
+        else:
+            candidates = []
+        candidates.append(self._call_backbone_with_input_ids)
+        if "x" in self._backbone_forward_params:
+            candidates.append(self._call_backbone_with_x)
+
+        error = None
+        for candidate in candidates:
+            try:
+                outputs = candidate(inputs, input_ids)
+            except TypeError as e:
+                # The backbone does not accept the arguments of this convention
+                error = e
+                continue
+            self._backbone_dispatchers[input_type] = (model, candidate)
+            return outputs
+
+        if "x" in self._backbone_forward_params:
+            raise RuntimeError(
+                f"Failed to get the last hidden state from the model, got error: {error}"
+            ) from error
+        raise ValueError("The model does not accept 'x' as input.") from error
+
+    def _call_backbone_with_structure(self, inputs, input_ids):
+        return self._structure_hidden_state_forward(inputs)
+
+    def _call_backbone_with_keywords(self, inputs, input_ids):
+        input_mapping = {
+            param: inputs[param]
+            for param in self._backbone_forward_params
+            if param in inputs
+        }
+        return self.model(**input_mapping, output_hidden_states=True)
+
+    def _call_backbone_with_input_ids(self, inputs, input_ids):
+        return self.model(input_ids=input_ids, output_hidden_states=True)
+
+    def _call_backbone_with_x(self, inputs, input_ids):
+        return self.model(x=input_ids)
+
     # def last_hidden_state_forward(self, inputs):
     #     """
     #
@@ -284,6 +332,15 @@ class OmniGenomeModel(torch.nn.Module):
     def set_loss_fn(self, loss_function):
         self.loss_fn = loss_function
 
+    def close(self):
+        """
+        Release the worker pools and the store connection of the structure cache of the
+        *With2DStructure models, they are created again by the next forward pass.
+        """
+        rna2structure = getattr(self.model, "rna2structure", None)
+        if rna2structure is not None:
+            rna2structure.close()
+
     def predict(self, sequence_or_inputs, **kwargs):
         # Please implement the predict() function for your model
         raw_outputs = self._forward_from_raw_input(sequence_or_inputs, **kwargs)
@@ -294,6 +351,20 @@ class OmniGenomeModel(torch.nn.Module):
         raw_outputs = self._forward_from_raw_input(sequence_or_inputs, **kwargs)
         return raw_outputs
 
+    def _load_structure_tokenizer(self):
+        """
+        Resolve the tokenizer of the secondary structures once, instead of loading it from the
+        file system in each forward pass. Falls back to the base tokenizer of the model.
+        """
+        try:
+            return AutoTokenizer.from_pretrained(self.config.name_or_path)
+        except Exception as e:
+            warnings.warn(
+                f"Cannot load the tokenizer from {self.config.name_or_path} due to {e}, "
+                f"using the tokenizer of the model to tokenize the structures."
+            )
+            return getattr(self.tokenizer, "base_tokenizer", self.tokenizer)
+
     def _structure_hidden_state_forward(self, inputs):
         model = self.model
 
@@ -317,26 +388,40 @@ class OmniGenomeModel(torch.nn.Module):
             )
             model.attn_head.to(seq_outputs.last_hidden_state.device)
 
-        tokenizer = AutoTokenizer.from_pretrained(self.config.name_or_path)
+        if getattr(self, "structure_tokenizer", None) is None:
+            self.structure_tokenizer = self._load_structure_tokenizer()
+        tokenizer = self.structure_tokenizer
         input_ids = inputs["input_ids"]
-        sequences = tokenizer.batch_decode(input_ids, skip_special_tokens=True)
-        sequences = [seq.replace(" ", "") for seq in sequences]
-        structures = model.rna2structure.fold([seq for seq in sequences])
-
-        # structures = [
-        #     f"{sequence}{tokenizer.eos_token}{structure}"
-        #     for (sequence, structure) in zip(sequences, structures)
-        # ]
-
-        tokenized_struct = tokenizer(
-            structures,
-            padding="max_length",
-            max_length=input_ids.shape[1],
-            truncation=True,
-            return_tensors="pt",
-            add_special_tokens=True,
-        )
-        tokenized_struct.to(input_ids.device)
+        if "structure_input_ids" in inputs:
+            # Tokenized by the dataset, see OmniGenomeDataset(structure_inputs=True)
+            tokenized_struct = {
+                key[len("structure_") :]: value
+                for key, value in inputs.items()
+                if key.startswith("structure_")
+            }
+        else:
+            if "structures" in inputs:
+                # Folded ahead of the forward pass, e.g., by the StructurePrefetcher
+                structures = inputs["structures"]
+            else:
+                sequences = tokenizer.batch_decode(input_ids, skip_special_tokens=True)
+                sequences = [seq.replace(" ", "") for seq in sequences]
+                structures = model.rna2structure.fold([seq for seq in sequences])
+
+            # structures = [
+            #     f"{sequence}{tokenizer.eos_token}{structure}"
+            #     for (sequence, structure) in zip(sequences, structures)
+            # ]
+
+            tokenized_struct = tokenizer(
+                structures,
+                padding="max_length",
+                max_length=input_ids.shape[1],
+                truncation=True,
+                return_tensors="pt",
+                add_special_tokens=True,
+            )
+            tokenized_struct.to(input_ids.device)
         str_outputs = model(
             **tokenized_struct,
             output_hidden_states=True,
@@ -452,9 +537,32 @@ class OmniGenomeModel(torch.nn.Module):
             )
         return self
 
+    def _id2label_array(self, num_labels):
+        """
+        :return: A NumPy array mapping the label ids in [0, num_labels) to the labels, with ""
+            for the ids without a label, to map a whole batch of predictions at once.
+        """
+        id2label = self.config.id2label if self.config.id2label else {}
+        return np.array([id2label.get(i, "") for i in range(num_labels)], dtype=object)
+
+    def _unpad_token_outputs(self, outputs, input_ids):
+        """
+        Remove the padding tokens, then the first and last tokens of each sequence from the
+        token-level outputs of a batch, with one device-to-host copy for the whole batch.
+        :param outputs: A tensor of shape (batch_size, seq_len, ...), e.g., the logits.
+        :param input_ids: The input_ids of the batch, used to find the padding tokens.
+        :return: A list of the CPU tensors of each sequence.
+        """
+        mask = input_ids.ne(self.config.pad_token_id)
+        lengths = mask.sum(dim=1).tolist()
+        outputs = outputs[mask].detach().cpu()
+        return [output[1:-1] for output in torch.split(outputs, lengths)]
+
     def _forward_from_raw_input(self, sequence_or_inputs, **kwargs):
-        if not isinstance(sequence_or_inputs, BatchEncoding) and not isinstance(
-            sequence_or_inputs, dict
+        # The inputs tokenized from the sequences in advance, e.g., by batch_inference()
+        inputs = kwargs.pop("inputs", None)
+        if inputs is None and not isinstance(
+            sequence_or_inputs, (BatchEncoding, dict)
         ):
             inputs = self.tokenizer(
                 sequence_or_inputs,
@@ -464,17 +572,178 @@ class OmniGenomeModel(torch.nn.Module):
                 return_tensors=kwargs.pop("return_tensors", "pt"),
                 **kwargs,
             )
-        else:
+        elif inputs is None:
             inputs = sequence_or_inputs
         inputs = inputs.to(self.model.device)
         for col in inputs:
-            if inputs[col] is not None and inputs[col].dtype == torch.int64:
+            if isinstance(inputs[col], torch.Tensor) and inputs[col].dtype == torch.int64:
                 inputs[col] = inputs[col].to(torch.int32)
         with torch.no_grad():
             raw_outputs = self(inputs)
             raw_outputs["inputs"] = inputs
         return raw_outputs
 
+    def _sliding_window_forward(self, sequences, **kwargs):
+        """
+        Compute the per-token logits of sequences longer than the model context. Each sequence is
+        split into overlapping windows, the windows are run in batches, and the logits of the
+        windows are stitched back by averaging the overlapping positions.
+        :param sequences: A sequence or a list of sequences.
+        :param kwargs: window_size (default: max_length - 2), window_stride (default: half of
+            the window_size) and batch_size (default: 8) of the windows.
+        :return: A list of tensors of shape (len(sequence), num_labels), one for each sequence.
+        """
+        if isinstance(sequences, str):
+            sequences = [sequences]
+        elif not isinstance(sequences, list):
+            raise ValueError("The sliding window inference only accepts raw sequences.")
+        check_single_nucleotide_tokenizer(self.tokenizer)
+
+        window_size = kwargs.pop("window_size", kwargs.pop("max_length", 1024) - 2)
+        window_stride = kwargs.pop("window_stride", None)
+        window_stride = window_stride if window_stride else window_size // 2
+        batch_size = kwargs.pop("batch_size", 8)
+
+        windows = [
+            (i, start, sequence[start : start + window_size])
+            for i, sequence in enumerate(sequences)
+            for start in sliding_window_starts(len(sequence), window_size, window_stride)
+        ]
+        logit_sums = [None] * len(sequences)
+        logit_counts = [torch.zeros(len(sequence), 1) for sequence in sequences]
+        for batch_start in range(0, len(windows), batch_size):
+            batch_windows = windows[batch_start : batch_start + batch_size]
+            raw_outputs = self._forward_from_raw_input(
+                [window for _, _, window in batch_windows],
+                max_length=window_size + 2,
+                **kwargs,
+            )
+            input_ids = raw_outputs["inputs"]["input_ids"]
+            logits = raw_outputs["logits"].float().cpu()
+            for j, (i, start, window) in enumerate(batch_windows):
+                # Remove the padding and the first and last (special) tokens
+                window_logits = logits[j][input_ids[j].ne(self.config.pad_token_id).cpu()][1:-1]
+                window_logits = window_logits[: len(window)]
+                if logit_sums[i] is None:
+                    logit_sums[i] = torch.zeros(
+                        (len(sequences[i]),) + tuple(window_logits.shape[1:])
+                    )
+                end = start + window_logits.shape[0]
+                logit_sums[i][start:end] += window_logits
+                logit_counts[i][start:end] += 1
+
+        return [
+            logit_sum / logit_count.clamp(min=1).view(-1, *([1] * (logit_sum.dim() - 1)))
+            for logit_sum, logit_count in zip(logit_sums, logit_counts)
+        ]
+
+    def batch_inference(self, sequences, batch_size=32, max_tokens=None, **kwargs):
+        """
+        Run inference() on any number of sequences. The sequences are sorted by length in chunks
+        and grouped into batches of at most batch_size sequences and max_tokens tokens, the next
+        batches are tokenized in a background thread while the model runs on the current batch.
+        :param sequences: A list or an iterable of sequences.
+        :param batch_size: The maximum number of sequences of a batch.
+        :param max_tokens: The maximum number of tokens of a padded batch, estimated from the
+            sequence lengths, None for no limit.
+        :param kwargs: The keyword arguments of the tokenizer and inference(), e.g., max_length,
+            and chunk_size (default: 100 * batch_size), the number of sequences sorted together,
+            which bounds the outputs buffered to restore the input order.
+        :return: A generator of the outputs of each sequence in the input order, i.e., dicts of
+            the predictions and the logits.
+        """
+        chunk_size = kwargs.pop("chunk_size", 100 * batch_size)
+        max_length = kwargs.pop("max_length", 1024)
+
+        def build_batches():
+            sequences_it = iter(sequences)
+            chunk_start = 0
+            while True:
+                chunk = []
+                for sequence in sequences_it:
+                    chunk.append(sequence)
+                    if len(chunk) >= chunk_size:
+                        break
+                if not chunk:
+                    return
+                # The longest sequences first, so an out-of-memory batch fails early
+                order = sorted(range(len(chunk)), key=lambda i: -len(chunk[i]))
+                batch = []
+                for i in order:
+                    num_tokens = min(len(chunk[i]) + 2, max_length)
+                    if batch and (
+                        len(batch) >= batch_size
+                        or max_tokens is not None
+                        and (len(batch) + 1) * batch_max_tokens > max_tokens
+                    ):
+                        yield batch, [chunk[j - chunk_start] for j in batch]
+                        batch = []
+                    if not batch:
+                        batch_max_tokens = num_tokens
+                    batch.append(chunk_start + i)
+                if batch:
+                    yield batch, [chunk[j - chunk_start] for j in batch]
+                chunk_start += len(chunk)
+
+        def produce():
+            try:
+                for batch_indices, batch_sequences in build_batches():
+                    inputs = self.tokenizer(
+                        batch_sequences,
+                        padding=True,
+                        max_length=max_length,
+                        truncation=True,
+                        return_tensors="pt",
+                    )
+                    while not stop_event.is_set():
+                        try:
+                            batches.put((batch_indices, batch_sequences, inputs), timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop_event.is_set():
+                        return
+            except Exception as e:
+                batches.put(e)
+            batches.put(None)
+
+        batches = queue.Queue(maxsize=2)
+        stop_event = threading.Event()
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        next_index = 0
+        buffered_outputs = {}
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                batch_indices, batch_sequences, inputs = batch
+                outputs = self.inference(
+                    batch_sequences, inputs=inputs, max_length=max_length, **kwargs
+                )
+                for j, index in enumerate(batch_indices):
+                    buffered_outputs[index] = {
+                        key: outputs[key][j].cpu()
+                        if isinstance(outputs[key], torch.Tensor)
+                        else outputs[key][j]
+                        for key in ["predictions", "logits"]
+                        if key in outputs
+                    }
+                while next_index in buffered_outputs:
+                    yield buffered_outputs.pop(next_index)
+                    next_index += 1
+        finally:
+            stop_event.set()
+            while producer.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
     @staticmethod
     def from_pretrained(model_name_or_path, tokenizer, *args, **kwargs):
         config = kwargs.pop("config", None)
@@ -8,11 +8,27 @@
 # Copyright (C) 2019-2024. All Rights Reserved.
 import warnings
 
-from transformers import AutoTokenizer
+import torch
+from transformers import AutoTokenizer, BatchEncoding
 
 from ..misc.utils import env_meta_info, load_module_from_path
 
 
+class _BaseTokenizerAttribute:
+    """
+    Non-data descriptor resolving an attribute of the wrapper from its base tokenizer without
+    going through a failed lookup first. Instance attributes of the wrapper still take priority.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return getattr(instance.base_tokenizer, self.name)
+
+
 class OmniGenomeTokenizer:
     def __init__(self, base_tokenizer=None, max_length=512, **kwargs):
         self.metadata = env_meta_info()
@@ -64,6 +80,46 @@ class OmniGenomeTokenizer:
             **kwargs,
         )
 
+    def batch_encode(self, sequences, **kwargs):
+        """
+        Encode a list of sequences into one padded BatchEncoding, so the per-call overhead of
+        the tokenizer is paid once per batch instead of once per sequence.
+        :param sequences: A list of sequences.
+        :param kwargs: The same keyword arguments as __call__(), the padding is always enabled.
+        :return: A BatchEncoding of tensors of shape (len(sequences), longest_length).
+        """
+        kwargs["padding"] = True
+        if type(self).__call__ is OmniGenomeTokenizer.__call__:
+            return self(sequences, **kwargs)
+        # The tokenizer wrappers encoding one sequence per call
+        return self._pad_batch([self(sequence, **kwargs) for sequence in sequences])
+
+    def _pad_batch(self, encodings):
+        """
+        Pad the encodings of single sequences into one batch, with the pad token id for the
+        input_ids, and 0 for the attention_mask and the other fields.
+        :param encodings: A list of dict-like encodings of single sequences.
+        :return: A BatchEncoding of padded tensors.
+        """
+        base_tokenizer = self.base_tokenizer
+        batch = {}
+        for key in encodings[0].keys():
+            values = [torch.as_tensor(encoding[key]).view(-1) for encoding in encodings]
+            width = max([len(value) for value in values])
+            padding_value = base_tokenizer.pad_token_id if key == "input_ids" else 0
+            padded_values = torch.full(
+                (len(values), width),
+                padding_value if padding_value is not None else 0,
+                dtype=values[0].dtype,
+            )
+            for padded_value, value in zip(padded_values, values):
+                if base_tokenizer.padding_side == "left":
+                    padded_value[width - len(value) :] = value
+                else:
+                    padded_value[: len(value)] = value
+            batch[key] = padded_values
+        return BatchEncoding(batch)
+
     def tokenize(self, sequence, **kwargs):
         raise NotImplementedError(
             "The tokenize() function should be adapted for different models,"
@@ -82,13 +138,38 @@ class OmniGenomeTokenizer:
             " please implement it for your model."
         )
 
-    def __getattribute__(self, item):
+    def __getattr__(self, item):
+        # Only called when the normal attribute lookup fails, so the attributes of the wrapper
+        # (e.g., max_length, u2t and base_tokenizer) are resolved as on a plain object.
+        if item == "base_tokenizer":
+            # The wrapper is not initialized yet, e.g., during unpickling or copying
+            raise AttributeError(
+                f"'{self.__class__.__name__}' object has no attribute '{item}'"
+            )
         try:
-            return super().__getattribute__(item)
-        except AttributeError:
-            try:
-                return self.base_tokenizer.__getattribute__(item)
-            except (AttributeError, RecursionError) as e:
-                raise AttributeError(
-                    f"'{self.__class__.__name__}' object has no attribute '{item}'"
-                ) from e
+            return getattr(self.base_tokenizer, item)
+        except (AttributeError, RecursionError) as e:
+            raise AttributeError(
+                f"'{self.__class__.__name__}' object has no attribute '{item}'"
+            ) from e
+
+
+# The base tokenizer attributes frequently accessed on the wrappers, e.g., per sample
+for _name in [
+    "pad_token_id",
+    "bos_token_id",
+    "eos_token_id",
+    "unk_token_id",
+    "sep_token_id",
+    "cls_token_id",
+    "mask_token_id",
+    "pad_token",
+    "eos_token",
+    "padding_side",
+    "vocab_size",
+    "convert_tokens_to_ids",
+    "convert_ids_to_tokens",
+    "get_vocab",
+]:
+    setattr(OmniGenomeTokenizer, _name, _BaseTokenizerAttribute(_name))
+del _name
@@ -11,3 +11,7 @@ from .omnigenome_dataset import OmniGenomeDatasetForSequenceClassification
 from .omnigenome_dataset import OmniGenomeDatasetForSequenceRegression
 from .omnigenome_dataset import OmniGenomeDatasetForTokenClassification
 from .omnigenome_dataset import OmniGenomeDatasetForTokenRegression
+from .omnigenome_dataset import OmniGenomeIterableDatasetForSequenceClassification
+from .omnigenome_dataset import OmniGenomeIterableDatasetForSequenceRegression
+from .omnigenome_dataset import OmniGenomeIterableDatasetForTokenClassification
+from .omnigenome_dataset import OmniGenomeIterableDatasetForTokenRegression
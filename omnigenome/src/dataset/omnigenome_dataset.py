@@ -11,26 +11,31 @@ import json
 import numpy as np
 import torch
 
-from ..abc.abstract_dataset import OmniGenomeDataset
+from ..abc.abstract_dataset import OmniGenomeDataset, OmniGenomeIterableDataset
 from ... import __name__, __version__
 
 
-class OmniGenomeDatasetForTokenClassification(OmniGenomeDataset):
-    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
-        super(OmniGenomeDatasetForTokenClassification, self).__init__(
-            data_source, tokenizer, max_length, **kwargs
-        )
+def _split_labels(labels):
+    """
+    Split the token labels stored as a string, e.g., "0.1 0.2 0.3", into a list.
+    """
+    if not isinstance(labels, str):
+        return list(labels)
+    try:
+        return list(json.loads(labels))
+    except:
+        for sep in [" ", ",", ";", "\t"]:
+            _labels = labels.split(sep)
+            if len(_labels) > 1:
+                break
+        return _labels
 
-        self.metadata.update(
-            {
-                "library_name": __name__,
-                "omnigenome_version": __version__,
-                "task": "genome_token_classification",
-            }
-        )
 
-        for key, value in kwargs.items():
-            self.metadata[key] = value
+class TokenClassificationInputMixin:
+    """
+    The prepare_input() of the genome token classification datasets, shared by the map-style
+    and the iterable datasets.
+    """
 
     def prepare_input(self, instance, **kwargs):
         labels = None
@@ -52,15 +57,13 @@ class OmniGenomeDatasetForTokenClassification(OmniGenomeDataset):
         else:
             raise Exception("Unknown instance format.")
 
-        tokenized_inputs = self.tokenizer(
-            sequence,
-            padding="do_not_pad",
-            truncation=True,
-            max_length=self.max_length,
-            return_tensors="pt",
-        )
-        for col in tokenized_inputs:
-            tokenized_inputs[col] = tokenized_inputs[col].squeeze()
+        if self.sliding_window and len(sequence) > self.max_length - 2:
+            return [
+                self.prepare_input(window, **kwargs)
+                for window in self._sliding_windows(sequence, labels)
+            ]
+
+        tokenized_inputs = self._tokenize(sequence)
 
         if labels is not None:
             tokenized_inputs["labels"] = (
@@ -74,21 +77,11 @@ class OmniGenomeDatasetForTokenClassification(OmniGenomeDataset):
         return tokenized_inputs
 
 
-class OmniGenomeDatasetForSequenceClassification(OmniGenomeDataset):
-    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
-        super(OmniGenomeDatasetForSequenceClassification, self).__init__(
-            data_source, tokenizer, max_length, **kwargs
-        )
-
-        self.metadata.update(
-            {
-                "library_name": __name__,
-                "omnigenome_version": __version__,
-                "task": "genome_sequence_classification",
-            }
-        )
-        for key, value in kwargs.items():
-            self.metadata[key] = value
+class SequenceClassificationInputMixin:
+    """
+    The prepare_input() of the genome sequence classification datasets, shared by the map-style
+    and the iterable datasets.
+    """
 
     def prepare_input(self, instance, **kwargs):
         labels = None
@@ -106,15 +99,7 @@ class OmniGenomeDatasetForSequenceClassification(OmniGenomeDataset):
         else:
             raise Exception("Unknown instance format.")
 
-        tokenized_inputs = self.tokenizer(
-            sequence,
-            padding="do_not_pad",
-            truncation=True,
-            max_length=self.max_length,
-            return_tensors="pt",
-        )
-        for col in tokenized_inputs:
-            tokenized_inputs[col] = tokenized_inputs[col].squeeze()
+        tokenized_inputs = self._tokenize(sequence)
 
         if labels is not None:
             tokenized_inputs["labels"] = (
@@ -124,22 +109,11 @@ class OmniGenomeDatasetForSequenceClassification(OmniGenomeDataset):
         return tokenized_inputs
 
 
-class OmniGenomeDatasetForTokenRegression(OmniGenomeDataset):
-    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
-        super(OmniGenomeDatasetForTokenRegression, self).__init__(
-            data_source, tokenizer, max_length, **kwargs
-        )
-
-        self.metadata.update(
-            {
-                "library_name": __name__,
-                "omnigenome_version": __version__,
-                "task": "genome_token_regression",
-            }
-        )
-
-        for key, value in kwargs.items():
-            self.metadata[key] = value
+class TokenRegressionInputMixin:
+    """
+    The prepare_input() of the genome token regression datasets, shared by the map-style
+    and the iterable datasets.
+    """
 
     def prepare_input(self, instance, **kwargs):
         labels = None
@@ -157,15 +131,16 @@ class OmniGenomeDatasetForTokenRegression(OmniGenomeDataset):
         else:
             raise Exception("Unknown instance format.")
 
-        tokenized_inputs = self.tokenizer(
-            sequence,
-            padding="do_not_pad",
-            truncation=True,
-            max_length=self.max_length,
-            return_tensors="pt",
-        )
-        for col in tokenized_inputs:
-            tokenized_inputs[col] = tokenized_inputs[col].squeeze()
+        if self.sliding_window and len(sequence) > self.max_length - 2:
+            windows = self._sliding_windows(
+                sequence, _split_labels(labels) if labels is not None else None
+            )
+            for window in windows:
+                if window["labels"] is not None:
+                    window["labels"] = " ".join([str(l) for l in window["labels"]])
+            return [self.prepare_input(window, **kwargs) for window in windows]
+
+        tokenized_inputs = self._tokenize(sequence)
 
         if labels is not None:
             try:
@@ -196,22 +171,11 @@ class OmniGenomeDatasetForTokenRegression(OmniGenomeDataset):
         return tokenized_inputs
 
 
-class OmniGenomeDatasetForSequenceRegression(OmniGenomeDataset):
-    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
-        super(OmniGenomeDatasetForSequenceRegression, self).__init__(
-            data_source, tokenizer, max_length, **kwargs
-        )
-
-        self.metadata.update(
-            {
-                "library_name": __name__,
-                "omnigenome_version": __version__,
-                "task": "genome_sequence_regression",
-            }
-        )
-
-        for key, value in kwargs.items():
-            self.metadata[key] = value
+class SequenceRegressionInputMixin:
+    """
+    The prepare_input() of the genome sequence regression datasets, shared by the map-style
+    and the iterable datasets.
+    """
 
     def prepare_input(self, instance, **kwargs):
         labels = None
@@ -229,15 +193,7 @@ class OmniGenomeDatasetForSequenceRegression(OmniGenomeDataset):
         else:
             raise Exception("Unknown instance format.")
 
-        tokenized_inputs = self.tokenizer(
-            sequence,
-            padding="do_not_pad",
-            truncation=True,
-            max_length=self.max_length,
-            return_tensors="pt",
-        )
-        for col in tokenized_inputs:
-            tokenized_inputs[col] = tokenized_inputs[col].squeeze()
+        tokenized_inputs = self._tokenize(sequence)
 
         if labels is not None:
             labels = np.array(labels, dtype=np.float32)
@@ -248,3 +204,162 @@ class OmniGenomeDatasetForSequenceRegression(OmniGenomeDataset):
             tokenized_inputs["labels"] = torch.tensor(labels, dtype=torch.float32)
 
         return tokenized_inputs
+
+
+class OmniGenomeDatasetForTokenClassification(
+    TokenClassificationInputMixin, OmniGenomeDataset
+):
+    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
+        super(OmniGenomeDatasetForTokenClassification, self).__init__(
+            data_source, tokenizer, max_length, **kwargs
+        )
+
+        self.metadata.update(
+            {
+                "library_name": __name__,
+                "omnigenome_version": __version__,
+                "task": "genome_token_classification",
+            }
+        )
+
+        for key, value in kwargs.items():
+            self.metadata[key] = value
+
+
+class OmniGenomeDatasetForSequenceClassification(
+    SequenceClassificationInputMixin, OmniGenomeDataset
+):
+    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
+        super(OmniGenomeDatasetForSequenceClassification, self).__init__(
+            data_source, tokenizer, max_length, **kwargs
+        )
+
+        self.metadata.update(
+            {
+                "library_name": __name__,
+                "omnigenome_version": __version__,
+                "task": "genome_sequence_classification",
+            }
+        )
+        for key, value in kwargs.items():
+            self.metadata[key] = value
+
+
+class OmniGenomeDatasetForTokenRegression(
+    TokenRegressionInputMixin, OmniGenomeDataset
+):
+    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
+        super(OmniGenomeDatasetForTokenRegression, self).__init__(
+            data_source, tokenizer, max_length, **kwargs
+        )
+
+        self.metadata.update(
+            {
+                "library_name": __name__,
+                "omnigenome_version": __version__,
+                "task": "genome_token_regression",
+            }
+        )
+
+        for key, value in kwargs.items():
+            self.metadata[key] = value
+
+
+class OmniGenomeDatasetForSequenceRegression(
+    SequenceRegressionInputMixin, OmniGenomeDataset
+):
+    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
+        super(OmniGenomeDatasetForSequenceRegression, self).__init__(
+            data_source, tokenizer, max_length, **kwargs
+        )
+
+        self.metadata.update(
+            {
+                "library_name": __name__,
+                "omnigenome_version": __version__,
+                "task": "genome_sequence_regression",
+            }
+        )
+
+        for key, value in kwargs.items():
+            self.metadata[key] = value
+
+
+class OmniGenomeIterableDatasetForTokenClassification(
+    TokenClassificationInputMixin, OmniGenomeIterableDataset
+):
+    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
+        super(OmniGenomeIterableDatasetForTokenClassification, self).__init__(
+            data_source, tokenizer, max_length, **kwargs
+        )
+
+        self.metadata.update(
+            {
+                "library_name": __name__,
+                "omnigenome_version": __version__,
+                "task": "genome_token_classification",
+            }
+        )
+
+        for key, value in kwargs.items():
+            self.metadata[key] = value
+
+
+class OmniGenomeIterableDatasetForSequenceClassification(
+    SequenceClassificationInputMixin, OmniGenomeIterableDataset
+):
+    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
+        super(OmniGenomeIterableDatasetForSequenceClassification, self).__init__(
+            data_source, tokenizer, max_length, **kwargs
+        )
+
+        self.metadata.update(
+            {
+                "library_name": __name__,
+                "omnigenome_version": __version__,
+                "task": "genome_sequence_classification",
+            }
+        )
+
+        for key, value in kwargs.items():
+            self.metadata[key] = value
+
+
+class OmniGenomeIterableDatasetForTokenRegression(
+    TokenRegressionInputMixin, OmniGenomeIterableDataset
+):
+    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
+        super(OmniGenomeIterableDatasetForTokenRegression, self).__init__(
+            data_source, tokenizer, max_length, **kwargs
+        )
+
+        self.metadata.update(
+            {
+                "library_name": __name__,
+                "omnigenome_version": __version__,
+                "task": "genome_token_regression",
+            }
+        )
+
+        for key, value in kwargs.items():
+            self.metadata[key] = value
+
+
+class OmniGenomeIterableDatasetForSequenceRegression(
+    SequenceRegressionInputMixin, OmniGenomeIterableDataset
+):
+    def __init__(self, data_source, tokenizer, max_length=None, **kwargs):
+        super(OmniGenomeIterableDatasetForSequenceRegression, self).__init__(
+            data_source, tokenizer, max_length, **kwargs
+        )
+
+        self.metadata.update(
+            {
+                "library_name": __name__,
+                "omnigenome_version": __version__,
+                "task": "genome_sequence_regression",
+            }
+        )
+
+        for key, value in kwargs.items():
+            self.metadata[key] = value
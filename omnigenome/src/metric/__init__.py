@@ -10,3 +10,8 @@
 from .classification_metric import ClassificationMetric
 from .ranking_metric import RankingMetric
 from .regression_metric import RegressionMetric
+from .streaming_metric import (
+    StreamingMetric,
+    StreamingClassificationMetric,
+    StreamingRegressionMetric,
+)
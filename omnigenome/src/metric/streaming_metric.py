@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+# file: streaming_metric.py
+# time: 17:05 18/10/2026
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# huggingface: https://huggingface.co/yangheng
+# google scholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# Copyright (C) 2019-2024. All Rights Reserved.
+
+import numpy as np
+import torch
+
+
+class StreamingMetric:
+    """
+    Abstract class for the metrics accumulated batch by batch. Each batch only updates small
+    sufficient statistics on the device of the predictions, so the labels and predictions of
+    the whole evaluation set are never held in memory. The Trainer feeds the instances of this
+    class in compute_metrics per batch; they can also be called as compute_metrics(y_true, y_pred).
+    """
+
+    def __init__(self, metrics=None, ignore_y=-100):
+        """
+        :param metrics: The names of the metrics to compute, in the sklearn.metrics naming.
+        :param ignore_y: The label value to ignore, e.g., the padded positions.
+        """
+        metrics = metrics if metrics is not None else self.default_metrics
+        self.metrics = [metrics] if isinstance(metrics, str) else list(metrics)
+        for metric in self.metrics:
+            if metric not in self.supported_metrics:
+                raise ValueError(
+                    f"{self.__class__.__name__} does not support {metric}, "
+                    f"the supported metrics are {self.supported_metrics}."
+                )
+        self.ignore_y = ignore_y
+        self.reset()
+
+    default_metrics = ()
+    supported_metrics = ()
+
+    def reset(self):
+        raise NotImplementedError(
+            "Method reset() is not implemented in the child class."
+        )
+
+    def _update(self, y_true, y_pred):
+        raise NotImplementedError(
+            "Method _update() is not implemented in the child class."
+        )
+
+    def compute(self) -> dict:
+        raise NotImplementedError(
+            "Method compute() is not implemented in the child class. "
+            "This function returns a dict containing the metric names and values."
+        )
+
+    def update(self, y_true, y_pred):
+        """
+        Accumulate the statistics of a batch, the positions labelled ignore_y are skipped.
+        :param y_true: the true values of the batch
+        :param y_pred: the predicted values of the batch
+        """
+        y_pred = torch.as_tensor(y_pred)
+        y_true = torch.as_tensor(y_true, device=y_pred.device)
+        y_true, y_pred = y_true.reshape(-1), y_pred.reshape(-1)
+        if y_true.numel() != y_pred.numel():
+            raise ValueError(
+                f"The number of true values ({y_true.numel()}) and predicted values "
+                f"({y_pred.numel()}) do not match."
+            )
+        if self.ignore_y is not None:
+            mask = y_true != self.ignore_y
+            y_true, y_pred = y_true[mask], y_pred[mask]
+        self._update(y_true, y_pred)
+
+    @property
+    def device(self):
+        """
+        :return: The device of the accumulated statistics, None before the first update.
+        """
+        raise NotImplementedError(
+            "Property device is not implemented in the child class."
+        )
+
+    def _state(self):
+        raise NotImplementedError(
+            "Method _state() is not implemented in the child class."
+        )
+
+    def _merge(self, states):
+        raise NotImplementedError(
+            "Method _merge() is not implemented in the child class."
+        )
+
+    def all_reduce(self):
+        """
+        Merge the statistics accumulated by all processes of the default process group, e.g.,
+        in distributed evaluation, so every process computes the metrics of the whole set.
+        """
+        states = [None] * torch.distributed.get_world_size()
+        torch.distributed.all_gather_object(states, self._state())
+        self._merge([state for state in states if state is not None])
+
+    def __call__(self, y_true, y_pred):
+        self.reset()
+        self.update(y_true, y_pred)
+        metrics = self.compute()
+        self.reset()
+        return metrics
+
+
+class StreamingClassificationMetric(StreamingMetric):
+    """
+    Classification metrics computed from a confusion matrix accumulated on the device.
+    """
+
+    default_metrics = ("accuracy_score", "f1_score")
+    supported_metrics = (
+        "accuracy_score",
+        "f1_score",
+        "precision_score",
+        "recall_score",
+        "matthews_corrcoef",
+    )
+
+    def __init__(self, metrics=None, num_labels=None, average="binary", ignore_y=-100):
+        """
+        :param metrics: The names of the metrics to compute, in the sklearn.metrics naming.
+        :param num_labels: The number of labels, grown with the largest label seen if None.
+        :param average: The averaging of f1, precision and recall, i.e., "binary" (the default
+            of sklearn, positive label 1), "macro", "micro" or "weighted".
+        :param ignore_y: The label value to ignore, e.g., the padded positions.
+        """
+        self.num_labels = num_labels
+        self.average = average
+        super().__init__(metrics, ignore_y)
+
+    def reset(self):
+        self.confusion_matrix = None
+
+    @property
+    def device(self):
+        if self.confusion_matrix is None:
+            return None
+        return self.confusion_matrix.device
+
+    def _update(self, y_true, y_pred):
+        y_true, y_pred = y_true.long(), y_pred.long()
+        num_labels = self.num_labels or 0
+        if self.num_labels is None and y_true.numel():
+            # Reading the largest label synchronizes with the device, pass num_labels to avoid it
+            num_labels = int(torch.maximum(y_true.max(), y_pred.max())) + 1
+        if self.confusion_matrix is None:
+            self.confusion_matrix = torch.zeros(
+                (num_labels, num_labels), dtype=torch.long, device=y_true.device
+            )
+        elif num_labels > self.confusion_matrix.shape[0]:
+            padding = num_labels - self.confusion_matrix.shape[0]
+            self.confusion_matrix = torch.nn.functional.pad(
+                self.confusion_matrix, (0, padding, 0, padding)
+            )
+        num_labels = self.confusion_matrix.shape[0]
+        self.confusion_matrix += torch.bincount(
+            y_true * num_labels + y_pred, minlength=num_labels * num_labels
+        ).reshape(num_labels, num_labels)
+
+    def _state(self):
+        if self.confusion_matrix is None:
+            return None
+        return self.confusion_matrix.cpu().numpy()
+
+    def _merge(self, states):
+        if not states:
+            self.confusion_matrix = None
+            return
+        num_labels = max(state.shape[0] for state in states)
+        confusion_matrix = np.zeros((num_labels, num_labels), dtype=np.int64)
+        for state in states:
+            confusion_matrix[: state.shape[0], : state.shape[1]] += state
+        self.confusion_matrix = torch.from_numpy(confusion_matrix)
+
+    def _average(self, scores, support, present):
+        if self.average == "binary":
+            if present[2:].any():
+                raise ValueError(
+                    "Target is multiclass but average='binary'. Please choose another "
+                    "average setting, one of ['micro', 'macro', 'weighted']."
+                )
+            return float(scores[1]) if len(scores) > 1 else 0.0
+        if self.average == "weighted":
+            return float((scores * support).sum() / max(support.sum(), 1))
+        # Only the labels present in the true or predicted values are averaged, like sklearn
+        return float(scores[present].mean()) if present.any() else 0.0
+
+    def compute(self) -> dict:
+        cm = (
+            self.confusion_matrix.cpu().numpy().astype(np.float64)
+            if self.confusion_matrix is not None
+            else np.zeros((0, 0))
+        )
+        tp = np.diag(cm)
+        support = cm.sum(axis=1)
+        predicted = cm.sum(axis=0)
+        total = cm.sum()
+        present = (support + predicted) > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.nan_to_num(tp / predicted)
+            recall = np.nan_to_num(tp / support)
+            f1 = np.nan_to_num(2 * tp / (support + predicted))
+
+        results = {}
+        for metric in self.metrics:
+            if metric == "accuracy_score":
+                results[metric] = float(tp.sum() / total) if total else 0.0
+            elif self.average == "micro" and metric != "matthews_corrcoef":
+                results[metric] = float(tp.sum() / total) if total else 0.0
+            elif metric == "f1_score":
+                results[metric] = self._average(f1, support, present)
+            elif metric == "precision_score":
+                results[metric] = self._average(precision, support, present)
+            elif metric == "recall_score":
+                results[metric] = self._average(recall, support, present)
+            elif metric == "matthews_corrcoef":
+                denominator = np.sqrt(
+                    (total**2 - (predicted**2).sum()) * (total**2 - (support**2).sum())
+                )
+                results[metric] = (
+                    float((tp.sum() * total - (predicted * support).sum()) / denominator)
+                    if denominator
+                    else 0.0
+                )
+        return results
+
+
+class StreamingRegressionMetric(StreamingMetric):
+    """
+    Regression metrics computed from the running moments accumulated on the device.
+    """
+
+    default_metrics = ("mean_squared_error", "r2_score")
+    supported_metrics = (
+        "mean_squared_error",
+        "root_mean_squared_error",
+        "mean_absolute_error",
+        "r2_score",
+        "pearsonr",
+    )
+
+    def reset(self):
+        # count, sum(y), sum(p), sum(y^2), sum(p^2), sum(y*p), sum(|y-p|)
+        self.moments = None
+
+    @property
+    def device(self):
+        if self.moments is None:
+            return None
+        return self.moments.device
+
+    def _update(self, y_true, y_pred):
+        y_true, y_pred = y_true.double(), y_pred.double()
+        moments = torch.stack(
+            [
+                torch.tensor(y_true.numel(), dtype=torch.float64, device=y_true.device),
+                y_true.sum(),
+                y_pred.sum(),
+                (y_true * y_true).sum(),
+                (y_pred * y_pred).sum(),
+                (y_true * y_pred).sum(),
+                (y_true - y_pred).abs().sum(),
+            ]
+        )
+        self.moments = moments if self.moments is None else self.moments + moments
+
+    def _state(self):
+        if self.moments is None:
+            return None
+        return self.moments.cpu()
+
+    def _merge(self, states):
+        self.moments = torch.stack(states).sum(dim=0) if states else None
+
+    def compute(self) -> dict:
+        if self.moments is None:
+            n, sy, sp, syy, spp, syp, sae = [0.0] * 7
+        else:
+            n, sy, sp, syy, spp, syp, sae = self.moments.cpu().tolist()
+        n_ = max(n, 1)
+        sse = syy - 2 * syp + spp
+        var_y = syy - sy * sy / n_
+        var_p = spp - sp * sp / n_
+        cov = syp - sy * sp / n_
+
+        results = {}
+        for metric in self.metrics:
+            if metric == "mean_squared_error":
+                results[metric] = sse / n_
+            elif metric == "root_mean_squared_error":
+                results[metric] = float(np.sqrt(max(sse, 0) / n_))
+            elif metric == "mean_absolute_error":
+                results[metric] = sae / n_
+            elif metric == "r2_score":
+                results[metric] = 1 - sse / var_y if var_y > 0 else 0.0
+            elif metric == "pearsonr":
+                results[metric] = (
+                    float(cov / np.sqrt(var_y * var_p))
+                    if var_y > 0 and var_p > 0
+                    else 0.0
+                )
+        return results
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# file: column_store.py
+# time: 16:05 18/10/2026
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# huggingface: https://huggingface.co/yangheng
+# google scholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# Copyright (C) 2019-2024. All Rights Reserved.
+import numpy as np
+import torch
+
+
+def smallest_int_dtype(min_value, max_value):
+    """
+    Find the smallest numpy integer dtype that can hold the values in [min_value, max_value].
+    """
+    for dtype in [np.uint8, np.int8, np.uint16, np.int16, np.int32, np.int64]:
+        info = np.iinfo(dtype)
+        if info.min <= min_value and max_value <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def torch_dtype_name(dtype):
+    return str(dtype).replace("torch.", "")
+
+
+class OmniGenomeColumnStore:
+    """
+    Columnar backing store of a tokenized dataset. Every field (e.g., input_ids, attention_mask
+    and labels) is kept in one contiguous numpy array of the smallest fitting dtype, instead of
+    a list of per-sample dicts of small tensors. Fields whose samples have different lengths are
+    stored flat with an offsets array.
+
+    Indexing with an integer returns zero-copy views in the storage dtypes, indexing with a slice
+    or a sequence of indices returns a batch (padded for ragged fields) in the original dtypes.
+    The samples and batches in the original dtypes are zero-copy only for the columns stored
+    in their original dtypes (compact=False), a compacted column is converted, i.e., copied.
+    """
+
+    def __init__(self, columns, dtypes, offsets=None, pad_values=None):
+        self.columns = columns
+        self.dtypes = dtypes
+        self.offsets = offsets if offsets else {}
+        self.pad_values = pad_values if pad_values else {}
+        key = next(iter(self.columns))
+        self.num_samples = (
+            len(self.offsets[key]) - 1 if key in self.offsets else len(self.columns[key])
+        )
+
+    @classmethod
+    def from_samples(cls, samples, pad_values=None, compact=True):
+        """
+        :param samples: A list of dicts of tensors with the same keys.
+        :param pad_values: The padding value of each field, used when batching ragged fields.
+        :param compact: Whether to store the integer fields in the smallest fitting dtypes.
+        """
+        columns, dtypes, offsets = {}, {}, {}
+        for key in samples[0].keys():
+            values = [sample[key] for sample in samples]
+            dtypes[key] = values[0].dtype
+            values = [value.numpy() for value in values]
+            if all(value.shape == values[0].shape for value in values):
+                column = np.stack(values)
+            else:
+                lengths = np.array([len(value) for value in values], dtype=np.int64)
+                offsets[key] = np.concatenate([[0], np.cumsum(lengths)])
+                column = np.concatenate(values)
+
+            if compact and np.issubdtype(column.dtype, np.integer) and column.size:
+                column = column.astype(
+                    smallest_int_dtype(column.min(), column.max()), copy=False
+                )
+            columns[key] = column
+        return cls(columns, dtypes, offsets, pad_values)
+
+    def __len__(self):
+        return self.num_samples
+
+    def keys(self):
+        return self.columns.keys()
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values()) + sum(
+            offsets.nbytes for offsets in self.offsets.values()
+        )
+
+    def view(self, idx):
+        """
+        :return: The idx-th sample as zero-copy tensor views in the storage dtypes.
+        """
+        sample = {}
+        for key, column in self.columns.items():
+            if key in self.offsets:
+                offsets = self.offsets[key]
+                sample[key] = torch.from_numpy(column[offsets[idx] : offsets[idx + 1]])
+            else:
+                sample[key] = torch.from_numpy(np.asarray(column[idx]))
+        return sample
+
+    def get(self, idx):
+        """
+        :return: The idx-th sample as tensors in the original dtypes, the columns stored in
+            their original dtypes are returned as zero-copy views.
+        """
+        return {
+            key: value.to(self.dtypes[key]) for key, value in self.view(idx).items()
+        }
+
+    def batch(self, indices, pad_to_multiple_of=None):
+        """
+        :param indices: A slice or a sequence of sample indices.
+        :param pad_to_multiple_of: Round up the padded length of the ragged fields.
+        :return: A dict of batched tensors in the original dtypes, a slice of a fixed-length
+            column stored in its original dtype is a zero-copy view.
+        """
+        rows = indices if isinstance(indices, slice) else None
+        if isinstance(indices, slice):
+            indices = np.arange(self.num_samples)[indices]
+        indices = np.asarray(indices, dtype=np.int64)
+
+        batch = {}
+        for key, column in self.columns.items():
+            if key in self.offsets:
+                starts = self.offsets[key][indices]
+                lengths = self.offsets[key][indices + 1] - starts
+                max_length = int(lengths.max()) if len(lengths) else 0
+                if (
+                    pad_to_multiple_of
+                    and lengths.min() != max_length
+                    and max_length % pad_to_multiple_of != 0
+                ):
+                    max_length += pad_to_multiple_of - max_length % pad_to_multiple_of
+                values = np.full(
+                    (len(indices), max_length) + column.shape[1:],
+                    self.pad_values.get(key, 0),
+                    dtype=column.dtype,
+                )
+                mask = np.arange(max_length) < lengths[:, None]
+                positions = starts[:, None] + np.arange(max_length)
+                values[mask] = column[positions[mask]]
+            else:
+                values = column[rows] if rows is not None else column[indices]
+            batch[key] = torch.from_numpy(values).to(self.dtypes[key])
+        return batch
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            return self.view(idx)
+        return self.batch(idx)
+
+    def column(self, key):
+        """
+        :return: The per-sample tensors of a field in the original dtype.
+        """
+        return [self.get(i)[key] for i in range(self.num_samples)]
+
+    def state(self):
+        """
+        :return: The arrays and the metadata needed to rebuild the store, e.g., from a cache.
+        """
+        arrays = dict(self.columns)
+        arrays.update({f"{key}.offsets": value for key, value in self.offsets.items()})
+        meta = {
+            "columns": list(self.columns.keys()),
+            "ragged_columns": list(self.offsets.keys()),
+            "dtypes": {key: torch_dtype_name(dtype) for key, dtype in self.dtypes.items()},
+            "pad_values": self.pad_values,
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_state(cls, arrays, meta):
+        columns = {key: arrays[key] for key in meta["columns"]}
+        offsets = {key: arrays[f"{key}.offsets"] for key in meta["ragged_columns"]}
+        dtypes = {key: getattr(torch, name) for key, name in meta["dtypes"].items()}
+        return cls(columns, dtypes, offsets, meta["pad_values"])
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# file: data_reader.py
+# time: 16:15 18/10/2026
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# huggingface: https://huggingface.co/yangheng
+# google scholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# Copyright (C) 2019-2024. All Rights Reserved.
+import gzip
+import json
+import warnings
+
+fasta_extensions = [".fasta", ".fa", ".fna", ".fas"]
+fastq_extensions = [".fastq", ".fq"]
+
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf8")
+    return open(path, "r", encoding="utf8")
+
+
+def _file_format(path):
+    if path.endswith(".gz"):
+        path = path[: -len(".gz")]
+    for extension in fasta_extensions:
+        if path.endswith(extension):
+            return "fasta"
+    for extension in fastq_extensions:
+        if path.endswith(extension):
+            return "fastq"
+    for extension in [".csv", ".json", ".jsonl", ".parquet", ".txt", ".dat"]:
+        if path.endswith(extension):
+            return extension[1:]
+    raise Exception("Unknown file format.")
+
+
+def _project(record, columns):
+    if columns is None:
+        return record
+    return {key: record[key] for key in columns if key in record}
+
+
+def _chunked(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if chunk_size and len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_fasta(path, columns=None):
+    """
+    Parse a (gzipped) FASTA file.
+    :param columns: The fields to build, None builds all of them.
+    :return: A generator of {"id": ..., "description": ..., "sequence": ...} records.
+    """
+    keep_sequence = columns is None or "sequence" in columns
+    with _open_text(path) as f:
+        header, lines = None, []
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(";"):
+                continue
+            if line.startswith(">"):
+                if header is not None:
+                    yield _fasta_record(header, lines, columns)
+                header, lines = line[1:], []
+            elif keep_sequence:
+                lines.append(line)
+        if header is not None:
+            yield _fasta_record(header, lines, columns)
+
+
+def _fasta_record(header, lines, columns=None):
+    record = {}
+    if columns is None or "id" in columns or "description" in columns:
+        name, _, description = header.partition(" ")
+        if columns is None or "id" in columns:
+            record["id"] = name
+        if columns is None or "description" in columns:
+            record["description"] = description
+    if columns is None or "sequence" in columns:
+        record["sequence"] = "".join(lines)
+    return record
+
+
+def iter_fastq(path, columns=None):
+    """
+    Parse a (gzipped) FASTQ file.
+    :param columns: The fields to build, None builds all of them.
+    :return: A generator of {"id": ..., "description": ..., "sequence": ..., "quality": ...} records.
+    """
+    with _open_text(path) as f:
+        while True:
+            header = f.readline()
+            if not header.strip():
+                return
+            sequence = f.readline().strip()
+            f.readline()  # The "+" separator line
+            quality = f.readline().strip()
+            if not header.startswith("@") or len(quality) != len(sequence):
+                raise ValueError(f"Malformed FASTQ record {header.strip()} in {path}")
+            record = {}
+            if columns is None or "id" in columns or "description" in columns:
+                name, _, description = header[1:].strip().partition(" ")
+                if columns is None or "id" in columns:
+                    record["id"] = name
+                if columns is None or "description" in columns:
+                    record["description"] = description
+            if columns is None or "sequence" in columns:
+                record["sequence"] = sequence
+            if columns is None or "quality" in columns:
+                record["quality"] = quality
+            yield record
+
+
+def iter_json_lines(path):
+    """
+    Parse a (gzipped) JSON-lines file line by line.
+    """
+    with _open_text(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_text_lines(path):
+    """
+    Read a (gzipped) text file with one sequence per line.
+    """
+    with _open_text(path) as f:
+        for line in f:
+            yield {"text": line.strip()}
+
+
+def read_data_source(path, columns=None, chunk_size=None):
+    """
+    Read the examples of a data file in chunks. Supported formats are csv, json (JSON lines),
+    parquet, txt/dat (one sequence per line), FASTA and FASTQ, optionally gzipped.
+    :param path: The path of the data file.
+    :param columns: The columns to read. The other columns are never materialized for csv,
+        parquet, FASTA and FASTQ, while the JSON lines are parsed in full and projected.
+    :param chunk_size: The number of examples of each chunk, None reads the file in one chunk.
+    :return: A generator of lists of examples, i.e., dicts.
+    """
+    file_format = _file_format(path)
+    if file_format == "csv":
+        import pandas as pd
+
+        if chunk_size:
+            for df in pd.read_csv(path, usecols=columns, chunksize=chunk_size):
+                yield df.to_dict("records")
+        else:
+            yield pd.read_csv(path, usecols=columns).to_dict("records")
+    elif file_format == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            pq = None
+
+        if pq is not None:
+            parquet_file = pq.ParquetFile(path)
+            for batch in parquet_file.iter_batches(
+                batch_size=chunk_size if chunk_size else 65536, columns=columns
+            ):
+                yield batch.to_pylist()
+        else:
+            import pandas as pd
+
+            if chunk_size:
+                warnings.warn(
+                    "pip install pyarrow to stream parquet files, "
+                    "falling back to load the whole file with pandas."
+                )
+            records = pd.read_parquet(path, columns=columns).to_dict("records")
+            yield from _chunked(records, chunk_size)
+    else:
+        if file_format == "fasta":
+            records = iter_fasta(path, columns)
+        elif file_format == "fastq":
+            records = iter_fastq(path, columns)
+        else:
+            if file_format in ["json", "jsonl"]:
+                records = iter_json_lines(path)
+            else:
+                records = iter_text_lines(path)
+            records = (_project(record, columns) for record in records)
+        yield from _chunked(records, chunk_size)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# file: dataset_cache.py
+# time: 15:20 18/10/2026
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# huggingface: https://huggingface.co/yangheng
+# google scholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# Copyright (C) 2019-2024. All Rights Reserved.
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import torch
+
+from .column_store import OmniGenomeColumnStore
+from .utils import fprint
+
+default_dataset_cache_dir = "__OMNIGENOME_DATA__/dataset_cache"
+
+
+def tokenizer_fingerprint(tokenizer):
+    """
+    Fingerprint the tokenizer by its class, the class of the base tokenizer, the vocabulary
+    and the options that change the tokenization results.
+    :param tokenizer: The tokenizer used to prepare the dataset.
+    :return: A dict describing the tokenizer.
+    """
+    base_tokenizer = getattr(tokenizer, "base_tokenizer", tokenizer)
+    try:
+        vocab = sorted(base_tokenizer.get_vocab().items())
+    except Exception:
+        vocab = []
+    return {
+        "tokenizer_cls": tokenizer.__class__.__name__,
+        "base_tokenizer_cls": base_tokenizer.__class__.__name__,
+        "vocab": hashlib.sha256(json.dumps(vocab).encode()).hexdigest(),
+        "options": {
+            key: getattr(tokenizer, key, None)
+            for key in ["u2t", "t2u", "add_whitespace", "k", "overlap"]
+        },
+    }
+
+
+def data_source_fingerprint(data_source, use_hash=False):
+    """
+    Fingerprint the data source files by their paths, sizes and modification times.
+    :param data_source: A data file or a list of data files.
+    :param use_hash: Whether to hash the file contents instead of using the modification times.
+    :return: A list of dicts describing the data files.
+    """
+    if not isinstance(data_source, list):
+        data_source = [data_source]
+
+    fingerprints = []
+    for path in data_source:
+        stat = os.stat(path)
+        fingerprint = {"path": os.path.abspath(path), "size": stat.st_size}
+        if use_hash:
+            sha256 = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha256.update(block)
+            fingerprint["sha256"] = sha256.hexdigest()
+        else:
+            fingerprint["mtime"] = stat.st_mtime_ns
+        fingerprints.append(fingerprint)
+    return fingerprints
+
+
+class OmniGenomeDatasetCache:
+    """
+    On-disk cache of tokenized datasets. Each entry is a directory named by the fingerprint,
+    holding the arrays of an OmniGenomeColumnStore as .npy files and a meta.json file. The columns are loaded with
+    copy-on-write memory mapping, so a cached dataset is available almost instantly and
+    several processes reading the same entry share one copy of the pages.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir if cache_dir else default_dataset_cache_dir
+
+    @staticmethod
+    def fingerprint(**kwargs):
+        return hashlib.sha256(
+            json.dumps(kwargs, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def load(self, fingerprint):
+        """
+        :param fingerprint: The fingerprint of the dataset.
+        :return: The cached OmniGenomeColumnStore backed by memory-mapped arrays and the
+            metadata, or None if not cached.
+        """
+        entry_dir = os.path.join(self.cache_dir, fingerprint)
+        meta_file = os.path.join(entry_dir, "meta.json")
+        if not os.path.exists(meta_file):
+            return None
+
+        with open(meta_file, "r", encoding="utf8") as f:
+            meta = json.load(f)
+        if "store" not in meta:  # An entry written in an outdated format
+            return None
+        arrays = {
+            key: np.load(os.path.join(entry_dir, f"{key}.npy"), mmap_mode="c")
+            for key in meta["arrays"]
+        }
+        return OmniGenomeColumnStore.from_state(arrays, meta["store"]), meta
+
+    def save(self, fingerprint, data, **meta):
+        """
+        :param fingerprint: The fingerprint of the dataset.
+        :param data: An OmniGenomeColumnStore, or a list of samples, i.e., dicts of tensors.
+        :param meta: Extra metadata stored along with the columns.
+        :return: True if the dataset has been cached.
+        """
+        if not isinstance(data, OmniGenomeColumnStore):
+            keys = list(data[0].keys())
+            for data_item in data:
+                if list(data_item.keys()) != keys or not all(
+                    isinstance(value, torch.Tensor) for value in data_item.values()
+                ):
+                    fprint("The dataset contains non-tensor fields, skip caching.")
+                    return False
+            # Keep the original dtypes, so the cached samples are loaded as zero-copy views
+            data = OmniGenomeColumnStore.from_samples(data, compact=False)
+
+        arrays, store_meta = data.state()
+        entry_dir = os.path.join(self.cache_dir, fingerprint)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            for key, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{key}.npy"), array)
+            meta.update(
+                {
+                    "arrays": list(arrays.keys()),
+                    "store": store_meta,
+                    "num_samples": len(data),
+                }
+            )
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf8") as f:
+                json.dump(meta, f)
+            # Publish the entry atomically, another process may have cached it in the meantime
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(entry_dir, "meta.json")):
+                raise
+        fprint(f"Cached the tokenized dataset to {entry_dir}")
+        return True
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# file: structure_store.py
+# time: 15:10 18/10/2026
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# huggingface: https://huggingface.co/yangheng
+# google scholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# Copyright (C) 2019-2024. All Rights Reserved.
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStructureStore:
+    """
+    On-disk key-value store of the folded structures, i.e., sequence -> (structure, mfe), backed
+    by SQLite in WAL mode. New entries are appended incrementally, lookups only read the queried
+    rows, and several processes on one machine can read and write the same file concurrently.
+    """
+
+    max_query_parameters = 500
+
+    def __init__(self, path, timeout=60):
+        """
+        :param path: The path of the SQLite database file, created if it does not exist.
+        :param timeout: The seconds to wait for the lock held by another writing process.
+        """
+        self.path = path
+        self.timeout = timeout
+        self._connection = None
+        self._pid = None
+        # The connection is shared by the threads of a process, its use is serialized
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self):
+        # SQLite connections cannot be shared across processes, reconnect after fork
+        if self._connection is None or self._pid != os.getpid():
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS structures "
+                "(sequence TEXT PRIMARY KEY, structure TEXT NOT NULL, mfe REAL)"
+            )
+            connection.commit()
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def get_many(self, sequences):
+        """
+        :param sequences: A list of sequences.
+        :return: A dict of the (structure, mfe) of the sequences found in the store.
+        """
+        results = {}
+        sequences = list(sequences)
+        with self._lock:
+            for i in range(0, len(sequences), self.max_query_parameters):
+                chunk = sequences[i : i + self.max_query_parameters]
+                rows = self.connection.execute(
+                    "SELECT sequence, structure, mfe FROM structures WHERE sequence IN "
+                    f"({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for sequence, structure, mfe in rows:
+                    results[sequence] = (structure, mfe)
+        return results
+
+    def put_many(self, items):
+        """
+        Append the entries in one transaction, the existing entries are kept.
+        :param items: A dict or an iterable of (sequence, (structure, mfe)) pairs.
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        rows = [(sequence, value[0], value[1]) for sequence, value in items]
+        if not rows:
+            return
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO structures (sequence, structure, mfe) VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def __getitem__(self, sequence):
+        value = self.get_many([sequence]).get(sequence)
+        if value is None:
+            raise KeyError(sequence)
+        return value
+
+    def __setitem__(self, sequence, value):
+        self.put_many([(sequence, value)])
+
+    def __contains__(self, sequence):
+        return sequence in self.get_many([sequence])
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM structures"
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
@@ -8,9 +8,12 @@
 # Copyright (C) 2019-2024. All Rights Reserved.
 import multiprocessing
 import os
+from collections import OrderedDict
 import pickle
 import sys
+import threading
 import time
+import weakref
 
 import ViennaRNA as RNA
 
@@ -32,31 +35,158 @@ def seed_everything(seed=42):
     torch.backends.cudnn.deterministic = True
 
 
+class LRUCache(OrderedDict):
+    """
+    A dict evicting the least recently used entries once it holds more than max_entries
+    entries or more than max_bytes bytes (estimated with sys.getsizeof of the keys and values).
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _sizeof(key, value):
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if isinstance(value, (tuple, list)):
+            size += sum(sys.getsizeof(v) for v in value)
+        return size
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self:
+            self.nbytes -= self._sizeof(key, super().__getitem__(key))
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        self.nbytes += self._sizeof(key, value)
+        while len(self) > 1 and (
+            (self.max_entries is not None and len(self) > self.max_entries)
+            or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+        ):
+            evicted_key, evicted_value = self.popitem(last=False)
+            self.nbytes -= self._sizeof(evicted_key, evicted_value)
+            self.evictions += 1
+
+    def update(self, other=(), **kwargs):
+        if isinstance(other, dict):
+            other = other.items()
+        for key, value in other:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+
+def _terminate_pools(pools, pid):
+    # The finalizer of RNA2StructureCache, it must not hold a reference to the cache itself
+    if pid == os.getpid():
+        for pool, _ in pools.values():
+            pool.terminate()
+    pools.clear()
+
+
 class RNA2StructureCache(dict):
+    legacy_cache_file = "__OMNIGENOME_DATA__/rna2stucture.cache.pkl"
+
     def __init__(self, cache_file=None, *args, **kwargs):
+        """
+        :param cache_file: The path of the on-disk cache. A *.pkl file is loaded entirely into
+            memory and rewritten as a whole, any other path is used as a SQLite database which is
+            appended incrementally, looked up lazily and safe to share between processes.
+        :param max_entries: The maximum number of structures kept in memory, the least recently
+            used ones are evicted and read back from the SQLite store when needed. Defaults to
+            100000 with a SQLite store and to unbounded otherwise, as the evicted entries of a
+            *.pkl cache are lost.
+        :param max_bytes: The maximum estimated size of the structures kept in memory.
+        :param thread_max_length: Fold the batches whose sequences are all shorter than this
+            length in a thread pool, as the IPC of the process pool dominates for them.
+        """
         import RNA
 
+        max_entries = kwargs.pop("max_entries", "auto")
+        max_bytes = kwargs.pop("max_bytes", None)
+        self.thread_max_length = kwargs.pop("thread_max_length", None)
         super().__init__(*args, **kwargs)
 
         if not cache_file:
-            self.cache_file = "__OMNIGENOME_DATA__/rna2stucture.cache.pkl"
+            self.cache_file = "__OMNIGENOME_DATA__/rna2structure.cache.db"
         else:
             self.cache_file = cache_file
 
-        if self.cache_file is None or not os.path.exists(self.cache_file):
-            self.cache = {}
-        else:
+        self.store = None
+        if self.cache_file is not None and not self.cache_file.endswith(".pkl"):
+            from .structure_store import SQLiteStructureStore
+
+            migrate = not os.path.exists(self.cache_file) and os.path.exists(
+                self.legacy_cache_file
+            )
+            self.store = SQLiteStructureStore(self.cache_file)
+            if migrate:
+                print(
+                    f"Migrating sequence to structure cache from {self.legacy_cache_file} "
+                    f"to {self.cache_file}..."
+                )
+                with open(self.legacy_cache_file, "rb") as f:
+                    self.store.put_many(pickle.load(f))
+
+        if max_entries == "auto":
+            max_entries = 100000 if self.store is not None else None
+        self.cache = LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.store is None and self.cache_file is not None and os.path.exists(
+            self.cache_file
+        ):
             print(f"Initialize sequence to structure cache from {self.cache_file}...")
             with open(self.cache_file, "rb") as f:
-                self.cache = pickle.load(f)
+                self.cache.update(pickle.load(f))
 
         self.queue_num = 0
+        # The long-lived worker pools, created on demand and reused by all fold() calls,
+        # they are terminated by close(), on exiting a with block or when garbage collected
+        self._pools = {}
+        self._pool_pid = None
+        self._pool_finalizer = None
+        # fold() may be called from several threads, e.g., by the StructurePrefetcher
+        self._lock = threading.RLock()
+
+    @property
+    def evictions(self):
+        return self.cache.evictions
+
+    def stats(self):
+        """
+        :return: The counters of the lookups of fold(): hits in memory, hits in the on-disk store,
+            misses (i.e., folded sequences) and evictions from memory.
+        """
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.cache),
+            "nbytes": self.cache.nbytes,
+        }
 
     def __getitem__(self, key):
-        return self.cache[key]
+        with self._lock:
+            if key not in self.cache and self.store is not None:
+                self.cache.update(self.store.get_many([key]))
+            return self.cache[key]
 
     def __setitem__(self, key, value):
-        self.cache[key] = value
+        with self._lock:
+            self.cache[key] = value
+            if self.store is not None:
+                self.store[key] = value
 
     def __str__(self):
         return str(self.cache)
@@ -65,6 +195,11 @@ class RNA2StructureCache(dict):
         return str(self.cache)
 
     def fold(self, sequence, return_mfe=False, num_workers=None):
+        # The LRU cache, the store connection and the pools are shared by the calling threads
+        with self._lock:
+            return self._fold(sequence, return_mfe, num_workers)
+
+    def _fold(self, sequence, return_mfe=False, num_workers=None):
         if num_workers is None or num_workers < 1:
             num_workers = os.cpu_count()
 
@@ -73,31 +208,47 @@ class RNA2StructureCache(dict):
         else:
             sequences = sequence
 
-        structures = []
-
-        if not all([seq in self.cache for seq in sequences]):
-            if num_workers == 1:
-                for seq in sequences:
-                    if seq not in self.cache:
-                        self.cache[seq] = RNA.fold(seq)
+        # Resolve the structures locally, the memory cache may evict entries while updating
+        found = {}
+        for seq in sequences:
+            if seq not in found and seq in self.cache:
+                found[seq] = self.cache[seq]
+        self.hits += len(found)
+        if self.store is not None:
+            disk_found = self.store.get_many(
+                {seq for seq in sequences if seq not in found}
+            )
+            self.disk_hits += len(disk_found)
+            found.update(disk_found)
+            self.cache.update(disk_found)
+
+        if not all([seq in found for seq in sequences]):
+            # Deduplicate the sequences to fold, keeping their order
+            missing = list({seq: None for seq in sequences if seq not in found})
+            if num_workers == 1 or len(missing) == 1:
+                folded = [RNA.fold(seq) for seq in missing]
             else:
-                if num_workers is None:
-                    num_workers = min(os.cpu_count(), len(sequences))
-
-                with multiprocessing.Pool(num_workers) as pool:
-                    for seq in sequences:
-                        if seq not in self.cache:
-                            self.queue_num += 1
-                            async_result = pool.apply_async(RNA.fold, args=(seq,))
-                            structures.append((seq, async_result))
-
-                    for seq, result in structures:
-                        self.cache[seq] = result.get()  # result is a tuple
+                num_workers = min(num_workers, len(missing))
+                use_threads = self.thread_max_length is not None and max(
+                    len(seq) for seq in missing
+                ) <= self.thread_max_length
+                pool = self._get_pool(num_workers, use_threads)
+                chunksize = max(1, len(missing) // (num_workers * 4))
+                folded = list(pool.imap(RNA.fold, missing, chunksize=chunksize))
+
+            # result is a tuple
+            new_structures = dict(zip(missing, folded))
+            found.update(new_structures)
+            self.queue_num += len(new_structures)
+            self.misses += len(new_structures)
+            self.cache.update(new_structures)
+            if self.store is not None:
+                self.store.put_many(new_structures)
 
         if return_mfe:
-            structures = [self.cache[seq] for seq in sequences]
+            structures = [found[seq] for seq in sequences]
         else:
-            structures = [self.cache[seq][0] for seq in sequences]
+            structures = [found[seq][0] for seq in sequences]
         self.update_cache_file(self.cache_file)
 
         if len(structures) == 1:
@@ -106,7 +257,8 @@ class RNA2StructureCache(dict):
             return structures
 
     def update_cache_file(self, cache_file=None):
-        if self.queue_num < 100:
+        if self.store is not None or self.queue_num < 100:
+            # The SQLite store is updated incrementally in fold()
             return
 
         if cache_file is None:
@@ -117,10 +269,106 @@ class RNA2StructureCache(dict):
 
         print(f"Updating cache file {cache_file}...")
         with open(cache_file, "wb") as f:
-            pickle.dump(self.cache, f)
+            pickle.dump(dict(self.cache.items()), f)
 
         self.queue_num = 0
 
+    def _get_pool(self, num_workers, use_threads=False):
+        if self._pool_pid != os.getpid():
+            # The pools of the parent process are not usable after fork
+            self._pools = {}
+            self._pool_pid = os.getpid()
+            self._pool_finalizer = weakref.finalize(
+                self, _terminate_pools, self._pools, self._pool_pid
+            )
+        pool_type = "thread" if use_threads else "process"
+        pool, pool_size = self._pools.get(pool_type, (None, 0))
+        if pool is None or pool_size < num_workers:
+            if pool is not None:
+                pool.terminate()
+            if use_threads:
+                from multiprocessing.pool import ThreadPool
+
+                pool = ThreadPool(num_workers)
+            else:
+                pool = multiprocessing.Pool(num_workers)
+            self._pools[pool_type] = (pool, num_workers)
+        return pool
+
+    def close(self):
+        """
+        Terminate the worker pools and close the on-disk store. The cache stays usable, the
+        pools and the connection to the store are created again when needed.
+        """
+        with self._lock:
+            if self._pool_finalizer is not None:
+                self._pool_finalizer()
+                self._pool_finalizer = None
+            self._pools = {}
+            self._pool_pid = None
+            if self.store is not None:
+                self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pools"] = {}
+        state["_pool_pid"] = None
+        state["_pool_finalizer"] = None
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+
+def sliding_window_starts(length, window_size, stride):
+    """
+    Compute the start positions of the overlapping windows covering a sequence.
+    :param length: The length of the sequence.
+    :param window_size: The size of each window.
+    :param stride: The distance between the starts of two consecutive windows.
+    :return: A list of start positions, the last window ends at the end of the sequence.
+    """
+    starts = list(range(0, max(length - window_size, 0) + 1, max(stride, 1)))
+    if starts[-1] + window_size < length:
+        starts.append(length - window_size)
+    return starts
+
+
+def check_single_nucleotide_tokenizer(tokenizer):
+    """
+    Make sure the tokenizer maps each nucleotide to one token. The sliding windows are cut
+    in nucleotides and aligned with the token labels and logits position by position, which
+    is wrong for the k-mer and BPE tokenizers.
+    :param tokenizer: The tokenizer of the dataset or the model.
+    :raise ValueError: If the tokenizer does not tokenize the nucleotides one by one.
+    """
+    from ..tokenizer import OmniBPETokenizer, OmniKmersTokenizer
+
+    if isinstance(tokenizer, OmniBPETokenizer) or (
+        isinstance(tokenizer, OmniKmersTokenizer) and tokenizer.k != 1
+    ):
+        single_nucleotide = False
+    else:
+        probe = "ACGUTN"
+        tokens = tokenizer.tokenize(probe)
+        if tokens and isinstance(tokens[0], list):
+            tokens = tokens[0]
+        single_nucleotide = len(tokens) == len(probe)
+    if not single_nucleotide:
+        raise ValueError(
+            f"The sliding windows require a single nucleotide tokenizer, "
+            f"got {tokenizer.__class__.__name__}. Use OmniSingleNucleotideTokenizer, "
+            f"or truncate the sequences to max_length instead of sliding_window=True."
+        )
+
 
 def env_meta_info():
     from torch.version import __version__ as torch_version
@@ -42,14 +42,8 @@ class OmniGenomeModelForTokenClassification(OmniGenomeModel):
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            predictions.append(logits[i].argmax(dim=-1).detach().cpu())
-
         outputs = {
-            "predictions": torch.stack(predictions)
-            if predictions[0].shape
-            else torch.tensor(predictions),
+            "predictions": logits.argmax(dim=-1).detach(),
             "logits": logits,
             "last_hidden_state": last_hidden_state,
         }
@@ -57,22 +51,31 @@ class OmniGenomeModelForTokenClassification(OmniGenomeModel):
         return outputs
 
     def inference(self, sequence_or_inputs, **kwargs):
+        if kwargs.pop("sliding_window", False):
+            # The logits of the long sequences are stitched from the overlapping windows
+            logits = self._sliding_window_forward(sequence_or_inputs, **kwargs)
+            labels = self._id2label_array(self.config.num_labels)
+            predictions = [
+                labels[logit.argmax(dim=-1).cpu().numpy()].tolist() for logit in logits
+            ]
+            if not isinstance(sequence_or_inputs, list):
+                return {"predictions": predictions[0], "logits": logits[0]}
+            return {"predictions": predictions, "logits": logits}
+
         raw_outputs = self._forward_from_raw_input(sequence_or_inputs, **kwargs)
         inputs = raw_outputs["inputs"]
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            # Note that the first and last tokens are removed,
-            # and the length of outputs are calculated based on the tokenized inputs.
-            i_logit = logits[i][inputs["input_ids"][i].ne(self.config.pad_token_id)][
-                1:-1
-            ]
-            prediction = [
-                self.config.id2label.get(x.item(), "") for x in i_logit.argmax(dim=-1)
-            ]
-            predictions.append(prediction)
+        # Note that the first and last tokens are removed,
+        # and the length of outputs are calculated based on the tokenized inputs.
+        labels = self._id2label_array(logits.shape[-1])
+        predictions = [
+            labels[predicted_ids.numpy()].tolist()
+            for predicted_ids in self._unpad_token_outputs(
+                logits.argmax(dim=-1), inputs["input_ids"]
+            )
+        ]
 
         if not isinstance(sequence_or_inputs, list):
             outputs = {
@@ -126,14 +129,8 @@ class OmniGenomeModelForSequenceClassification(OmniGenomeModel):
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            predictions.append(logits[i].argmax(dim=-1))
-
         outputs = {
-            "predictions": torch.stack(predictions)
-            if predictions[0].shape
-            else torch.tensor(predictions),
+            "predictions": logits.argmax(dim=-1),
             "logits": logits,
             "last_hidden_state": last_hidden_state,
         }
@@ -146,11 +143,8 @@ class OmniGenomeModelForSequenceClassification(OmniGenomeModel):
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            predictions.append(
-                self.config.id2label.get(logits[i].argmax(dim=-1).item(), "")
-            )
+        labels = self._id2label_array(logits.shape[-1])
+        predictions = labels[logits.argmax(dim=-1).cpu().numpy()].tolist()
 
         if not isinstance(sequence_or_inputs, list):
             outputs = {
@@ -192,15 +186,8 @@ class OmniGenomeModelForMultiLabelSequenceClassification(
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            prediction = logits[i].ge(0.5).to(torch.int).cpu()
-            predictions.append(prediction)
-
         outputs = {
-            "predictions": torch.stack(predictions)
-            if predictions[0].shape
-            else torch.tensor(predictions),
+            "predictions": logits.ge(0.5).to(torch.int),
             "logits": logits,
             "last_hidden_state": last_hidden_state,
         }
@@ -217,6 +204,7 @@ class OmniGenomeModelForTokenClassificationWith2DStructure(
     def __init__(self, config_or_model_model, tokenizer, *args, **kwargs):
         super().__init__(config_or_model_model, tokenizer, *args, **kwargs)
         self.metadata["model_name"] = self.__class__.__name__
+        self.structure_tokenizer = self._load_structure_tokenizer()
         self.pooler = OmniGenomePooling(self.config)
         self.model_info()
 
@@ -240,6 +228,7 @@ class OmniGenomeModelForSequenceClassificationWith2DStructure(
     def __init__(self, config_or_model_model, tokenizer, *args, **kwargs):
         super().__init__(config_or_model_model, tokenizer, *args, **kwargs)
         self.metadata["model_name"] = self.__class__.__name__
+        self.structure_tokenizer = self._load_structure_tokenizer()
         self.pooler = OmniGenomePooling(self.config)
         self.model_info()
 
@@ -279,15 +268,8 @@ class OmniGenomeModelForMultiLabelSequenceClassificationWith2DStructure(
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            prediction = logits[i].ge(0.5).to(torch.int).cpu()
-            predictions.append(prediction)
-
         outputs = {
-            "predictions": torch.stack(predictions)
-            if predictions[0].shape
-            else torch.tensor(predictions),
+            "predictions": logits.ge(0.5).to(torch.int),
             "logits": logits,
             "last_hidden_state": last_hidden_state,
         }
@@ -47,9 +47,7 @@ class OmniGenomeModelForMLM(OmniGenomeModel):
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            predictions.append(logits[i].argmax(dim=-1).cpu())
+        predictions = logits.argmax(dim=-1).cpu()
 
         if not isinstance(sequence_or_inputs, list):
             outputs = {
@@ -59,9 +57,7 @@ class OmniGenomeModelForMLM(OmniGenomeModel):
             }
         else:
             outputs = {
-                "predictions": torch.stack(predictions)
-                if predictions[0].shape
-                else torch.tensor(predictions),
+                "predictions": predictions,
                 "logits": logits,
                 "last_hidden_state": last_hidden_state,
             }
@@ -75,13 +71,12 @@ class OmniGenomeModelForMLM(OmniGenomeModel):
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            i_logit = logits[i][inputs["input_ids"][i].ne(self.config.pad_token_id)][
-                1:-1
-            ]
-            prediction = self.tokenizer.decode(i_logit.argmax(dim=-1)).replace(" ", "")
-            predictions.append(list(prediction))
+        predictions = [
+            list(self.tokenizer.decode(predicted_ids).replace(" ", ""))
+            for predicted_ids in self._unpad_token_outputs(
+                logits.argmax(dim=-1), inputs["input_ids"]
+            )
+        ]
 
         if not isinstance(sequence_or_inputs, list):
             outputs = {
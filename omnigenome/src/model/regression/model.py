@@ -43,14 +43,8 @@ class OmniGenomeModelForTokenRegression(OmniGenomeModel):
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            predictions.append(logits[i].cpu())
-
         outputs = {
-            "predictions": torch.stack(predictions)
-            if predictions[0].shape
-            else torch.tensor(predictions),
+            "predictions": logits,
             "logits": logits,
             "last_hidden_state": last_hidden_state,
         }
@@ -58,18 +52,21 @@ class OmniGenomeModelForTokenRegression(OmniGenomeModel):
         return outputs
 
     def inference(self, sequence_or_inputs, **kwargs):
+        if kwargs.pop("sliding_window", False):
+            # The logits of the long sequences are stitched from the overlapping windows
+            logits = self._sliding_window_forward(sequence_or_inputs, **kwargs)
+            predictions = logits
+            if not isinstance(sequence_or_inputs, list):
+                return {"predictions": predictions[0], "logits": logits[0]}
+            return {"predictions": predictions, "logits": logits}
+
         raw_outputs = self._forward_from_raw_input(sequence_or_inputs, **kwargs)
 
         inputs = raw_outputs["inputs"]
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            i_logit = logits[i][inputs["input_ids"][i].ne(self.config.pad_token_id)][
-                1:-1
-            ]
-            predictions.append(i_logit.detach().cpu())
+        predictions = self._unpad_token_outputs(logits, inputs["input_ids"])
 
         if not isinstance(sequence_or_inputs, list):
             outputs = {
@@ -131,14 +128,8 @@ class OmniGenomeModelForSequenceRegression(OmniGenomeModel):
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            predictions.append(logits[i].cpu())
-
         outputs = {
-            "predictions": torch.stack(predictions)
-            if predictions[0].shape
-            else torch.tensor(predictions),
+            "predictions": logits,
             "logits": logits,
             "last_hidden_state": last_hidden_state,
         }
@@ -151,9 +142,7 @@ class OmniGenomeModelForSequenceRegression(OmniGenomeModel):
         logits = raw_outputs["logits"]
         last_hidden_state = raw_outputs["last_hidden_state"]
 
-        predictions = []
-        for i in range(logits.shape[0]):
-            predictions.append(logits[i].cpu())
+        predictions = list(logits.cpu())
 
         if not isinstance(sequence_or_inputs, list):
             outputs = {
@@ -191,6 +180,7 @@ class OmniGenomeModelForTokenRegressionWith2DStructure(
     def __init__(self, config_or_model_model, tokenizer, *args, **kwargs):
         super().__init__(config_or_model_model, tokenizer, *args, **kwargs)
         self.metadata["model_name"] = self.__class__.__name__
+        self.structure_tokenizer = self._load_structure_tokenizer()
         self.pooler = OmniGenomePooling(self.config)
         self.classifier = torch.nn.Linear(
             self.config.hidden_size, self.config.num_labels
@@ -216,6 +206,7 @@ class OmniGenomeModelForSequenceRegressionWith2DStructure(
     def __init__(self, config_or_model_model, tokenizer, *args, **kwargs):
         super().__init__(config_or_model_model, tokenizer, *args, **kwargs)
         self.metadata["model_name"] = self.__class__.__name__
+        self.structure_tokenizer = self._load_structure_tokenizer()
         self.pooler = OmniGenomePooling(self.config)
         self.classifier = torch.nn.Linear(
             self.config.hidden_size, self.config.num_labels
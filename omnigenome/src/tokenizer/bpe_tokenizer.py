@@ -32,19 +32,32 @@ class OmniBPETokenizer(OmniGenomeTokenizer):
     def __init__(self, base_tokenizer=None, **kwargs):
         super(OmniBPETokenizer, self).__init__(base_tokenizer, **kwargs)
         self.metadata["tokenizer_name"] = self.__class__.__name__
+        self._is_bpe_checked = False
 
-    def __call__(self, sequence, **kwargs):
+    def _check_bpe_tokenization(self, sequence_tokens):
+        # The check only depends on the tokenizer, so it runs once per tokenizer
+        if not self._is_bpe_checked and sequence_tokens:
+            if not is_bpe_tokenization(sequence_tokens):
+                raise ValueError("The tokenizer seems not to be a BPE tokenizer.")
+            self._is_bpe_checked = True
+
+    def _convert_sequence(self, sequence):
         if self.u2t:
             sequence = sequence.replace("U", "T")
         if self.add_whitespace:
             sequence = " ".join(list(sequence))
+        return sequence
+
+    def __call__(self, sequence, **kwargs):
+        sequence = self._convert_sequence(sequence)
 
         sequence_tokens = self.tokenize(sequence)[
             : min(self.max_length, kwargs.get("max_length", 512)) - 2
         ]
 
-        if not is_bpe_tokenization(sequence_tokens):
+        if not sequence_tokens:
             raise ValueError("The tokenizer seems not to be a BPE tokenizer.")
+        self._check_bpe_tokenization(sequence_tokens)
         tokenized_inputs = dict()
         tokenized_inputs["input_ids"] = self.base_tokenizer.convert_tokens_to_ids(
             sequence_tokens
@@ -59,6 +72,28 @@ class OmniBPETokenizer(OmniGenomeTokenizer):
         )
         return tokenized_inputs
 
+    def batch_encode(self, sequences, **kwargs):
+        sequences = [self._convert_sequence(sequence) for sequence in sequences]
+        max_tokens = min(self.max_length, kwargs.get("max_length", 512)) - 2
+        if getattr(self.base_tokenizer, "is_fast", False):
+            # The fast tokenizers encode the whole batch in parallel
+            all_ids = self.base_tokenizer(sequences, add_special_tokens=False)["input_ids"]
+            self._check_bpe_tokenization(
+                self.base_tokenizer.convert_ids_to_tokens(all_ids[0][:max_tokens])
+            )
+        else:
+            all_ids = []
+            for sequence in sequences:
+                sequence_tokens = self.tokenize(sequence)[:max_tokens]
+                self._check_bpe_tokenization(sequence_tokens)
+                all_ids.append(self.base_tokenizer.convert_tokens_to_ids(sequence_tokens))
+        return self._pad_batch(
+            [
+                {"input_ids": ids[:max_tokens], "attention_mask": [1] * len(ids[:max_tokens])}
+                for ids in all_ids
+            ]
+        )
+
     @staticmethod
     def from_pretrained(model_name_or_path, **kwargs):
         from transformers import AutoTokenizer
@@ -8,8 +8,14 @@
 # Copyright (C) 2019-2024. All Rights Reserved.
 import warnings
 
+import numpy as np
+import torch
+
 from ..abc.abstract_tokenizer import OmniGenomeTokenizer
 
+# The largest k-mer id table to precompute, i.e., len(alphabet) ** k entries
+max_kmer_table_size = 1 << 22
+
 
 class OmniKmersTokenizer(OmniGenomeTokenizer):
     def __init__(self, base_tokenizer=None, k=3, overlap=0, max_length=512, **kwargs):
@@ -18,8 +24,20 @@ class OmniKmersTokenizer(OmniGenomeTokenizer):
         self.overlap = overlap
         self.max_length = max_length
         self.metadata["tokenizer_name"] = self.__class__.__name__
+        self._kmer_tables = None
+        self._kmer_tables_key = None
 
     def __call__(self, sequence, **kwargs):
+        sequences = [sequence] if isinstance(sequence, str) else sequence
+        if (
+            isinstance(sequences, list)
+            and sequences
+            and all(isinstance(seq, str) and seq.isascii() for seq in sequences)
+            and self.k > self.overlap
+            and self._kmer_id_tables() is not None
+        ):
+            return self._encode_with_rolling_kmers(sequences, **kwargs)
+
         if self.u2t:
             sequence = "".join([seq.replace("U", "T").upper() for seq in sequence])
         if self.t2u:
@@ -65,6 +83,131 @@ class OmniKmersTokenizer(OmniGenomeTokenizer):
         )
         return tokenized_inputs
 
+    def batch_encode(self, sequences, **kwargs):
+        if (
+            all(isinstance(seq, str) and seq.isascii() for seq in sequences)
+            and self.k > self.overlap
+            and self._kmer_id_tables() is not None
+        ):
+            return self._encode_with_rolling_kmers(sequences, **kwargs)
+        return super(OmniKmersTokenizer, self).batch_encode(sequences, **kwargs)
+
+    def _convert_sequence(self, sequence):
+        if self.u2t:
+            sequence = sequence.replace("U", "T").upper()
+        if self.t2u:
+            sequence = sequence.replace("T", "U").upper()
+        return sequence
+
+    def _kmer_id_tables(self):
+        """
+        Precompute the tables of the rolling k-mer encoder: a byte-to-digit table over the
+        alphabet of the k-mers in the vocabulary (-1 for the other characters), and a table
+        mapping each base-len(alphabet) k-mer code to its token id.
+        :return: The two tables and the size of the alphabet, or None if the vocabulary is
+            not a k-mer vocabulary of a small alphabet.
+        """
+        key = (self.k, self.u2t, self.t2u)
+        if self._kmer_tables_key != key:
+            self._kmer_tables_key = key
+            self._kmer_tables = None
+            alphabet = sorted(
+                {
+                    char
+                    for token in self.base_tokenizer.get_vocab()
+                    if len(token) == self.k and token.isalpha()
+                    for char in token
+                }
+            )
+            if alphabet and len(alphabet) ** self.k <= max_kmer_table_size:
+                byte_to_digit = np.full(256, -1, dtype=np.int64)
+                for byte in range(128):
+                    char = self._convert_sequence(chr(byte))
+                    if char in alphabet:
+                        byte_to_digit[byte] = alphabet.index(char)
+
+                codes = np.arange(len(alphabet) ** self.k)
+                kmers = [""] * len(codes)
+                for i in range(self.k):
+                    digits = codes // len(alphabet) ** (self.k - 1 - i) % len(alphabet)
+                    kmers = [kmer + alphabet[d] for kmer, d in zip(kmers, digits)]
+                unk_token_id = self.base_tokenizer.unk_token_id
+                code_to_id = np.array(
+                    [
+                        unk_token_id if token_id is None else token_id
+                        for token_id in self.base_tokenizer.convert_tokens_to_ids(kmers)
+                    ],
+                    dtype=np.int64,
+                )
+                self._kmer_tables = (byte_to_digit, code_to_id, len(alphabet))
+        return self._kmer_tables
+
+    def _encode_with_rolling_kmers(self, sequences, **kwargs):
+        """
+        Encode a batch of ASCII sequences with the k-mer codes computed arithmetically, the
+        results are identical to tokenize() followed by the vocabulary lookup. The trailing
+        k-mers shorter than k (and the k-mers with characters outside the alphabet) are looked
+        up as strings.
+        """
+        byte_to_digit, code_to_id, base = self._kmer_id_tables()
+        k, stride = self.k, self.k - self.overlap
+        buffer = np.frombuffer("".join(sequences).encode("ascii"), dtype=np.uint8)
+        digits = byte_to_digit[buffer]
+
+        # The code of the k-mer starting at each position of the concatenated sequences
+        num_windows = max(len(digits) - k + 1, 0)
+        codes = np.zeros(num_windows, dtype=np.int64)
+        invalid = np.zeros(num_windows, dtype=bool)
+        for i in range(k):
+            codes = codes * base + digits[i : i + num_windows]
+            invalid |= digits[i : i + num_windows] < 0
+        kmer_ids = code_to_id[np.where(invalid, 0, codes)]
+
+        bos_id = (
+            self.base_tokenizer.bos_token_id
+            if self.base_tokenizer.bos_token_id is not None
+            else self.base_tokenizer.cls_token_id
+        )
+        eos_id = (
+            self.base_tokenizer.eos_token_id
+            if self.base_tokenizer.eos_token_id is not None
+            else self.base_tokenizer.sep_token_id
+        )
+        all_ids = []
+        start = 0
+        for sequence in sequences:
+            positions = np.arange(start, start + max(len(sequence) - k + 1, 0), stride)
+            ids = kmer_ids[positions]
+            if invalid[positions].any():
+                for i in np.where(invalid[positions])[0]:
+                    kmer = sequence[positions[i] - start : positions[i] - start + k]
+                    ids[i] = self.base_tokenizer.convert_tokens_to_ids(
+                        self._convert_sequence(kmer)
+                    )
+            tail_kmers = [
+                self._convert_sequence(sequence[j : j + k])
+                for j in range(len(positions) * stride, len(sequence), stride)
+            ]
+            if tail_kmers:
+                ids = np.concatenate(
+                    [ids, self.base_tokenizer.convert_tokens_to_ids(tail_kmers)]
+                )
+            all_ids.append(np.concatenate([[bos_id], ids, [eos_id]]).astype(np.int64))
+            start += len(sequence)
+
+        for i, ids in enumerate(all_ids):
+            if np.sum(ids == self.base_tokenizer.unk_token_id) / len(ids) > 0.1:
+                warnings.warn(
+                    f"Unknown tokens are more than 10% in the {i}th sequence, please check the tokenization process."
+                )
+
+        return self._pad_batch(
+            [
+                {"input_ids": torch.from_numpy(ids), "attention_mask": np.ones_like(ids)}
+                for ids in all_ids
+            ]
+        )
+
     @staticmethod
     def from_pretrained(model_name_or_path, **kwargs):
         from transformers import AutoTokenizer
@@ -9,7 +9,9 @@
 
 import warnings
 
-from transformers import AutoTokenizer
+import numpy as np
+import torch
+from transformers import AutoTokenizer, BatchEncoding
 
 from ..abc.abstract_tokenizer import OmniGenomeTokenizer
 
@@ -18,8 +20,20 @@ class OmniSingleNucleotideTokenizer(OmniGenomeTokenizer):
     def __init__(self, base_tokenizer=None, **kwargs):
         super(OmniSingleNucleotideTokenizer, self).__init__(base_tokenizer, **kwargs)
         self.metadata["tokenizer_name"] = self.__class__.__name__
+        self._byte_to_id = None
+        self._byte_to_id_key = None
 
     def __call__(self, sequence, **kwargs):
+        sequences = [sequence] if isinstance(sequence, str) else sequence
+        if (
+            not self.add_whitespace
+            and kwargs.get("return_attention_mask", True)
+            and isinstance(sequences, list)
+            and sequences
+            and all(isinstance(seq, str) and seq.isascii() for seq in sequences)
+        ):
+            return self._encode_with_lookup_table(sequences, **kwargs)
+
         if self.u2t:
             sequence = "".join([seq.replace("U", "T").upper() for seq in sequence])
         if self.t2u:
@@ -69,6 +83,116 @@ class OmniSingleNucleotideTokenizer(OmniGenomeTokenizer):
         )
         return tokenized_inputs
 
+    def batch_encode(self, sequences, **kwargs):
+        if not self.add_whitespace and all(
+            isinstance(seq, str) and seq.isascii() for seq in sequences
+        ):
+            kwargs["padding"] = True
+            return self._encode_with_lookup_table(sequences, **kwargs)
+        return super(OmniSingleNucleotideTokenizer, self).batch_encode(
+            sequences, **kwargs
+        )
+
+    def _byte_to_id_table(self):
+        """
+        :return: A 256-entry table mapping each byte (character) to its token id, with the
+            U->T / T->U conversion and the upper-casing of __call__ folded in.
+        """
+        if self._byte_to_id is None or self._byte_to_id_key != (self.u2t, self.t2u):
+            tokens = []
+            for byte in range(256):
+                token = chr(byte)
+                if self.u2t:
+                    token = token.replace("U", "T").upper()
+                if self.t2u:
+                    token = token.replace("T", "U").upper()
+                tokens.append(token)
+            unk_token_id = self.base_tokenizer.unk_token_id
+            self._byte_to_id = np.array(
+                [
+                    unk_token_id if token_id is None else token_id
+                    for token_id in self.base_tokenizer.convert_tokens_to_ids(tokens)
+                ],
+                dtype=np.int64,
+            )
+            self._byte_to_id_key = (self.u2t, self.t2u)
+        return self._byte_to_id
+
+    def _encode_with_lookup_table(self, sequences, **kwargs):
+        """
+        Encode a batch of ASCII sequences with array operations, the results are identical to
+        the per-token conversion in __call__ (the sequences are not truncated either).
+        """
+        base_tokenizer = self.base_tokenizer
+        bos_id = (
+            base_tokenizer.bos_token_id
+            if base_tokenizer.bos_token_id is not None
+            else base_tokenizer.cls_token_id
+        )
+        eos_id = (
+            base_tokenizer.eos_token_id
+            if base_tokenizer.eos_token_id is not None
+            else base_tokenizer.sep_token_id
+        )
+        seq_lengths = np.array([len(seq) for seq in sequences], dtype=np.int64)
+        lengths = seq_lengths + 2
+        width = int(lengths.max())
+        if kwargs.get("padding", "max_length") in [False, "do_not_pad"] and np.any(
+            lengths != width
+        ):
+            raise ValueError(
+                "Cannot return the unpadded sequences of different lengths as tensors."
+            )
+
+        token_ids = self._byte_to_id_table()[
+            np.frombuffer("".join(sequences).encode("ascii"), dtype=np.uint8)
+        ]
+        rows = np.repeat(np.arange(len(sequences)), seq_lengths)
+        starts = np.cumsum(seq_lengths) - seq_lengths
+        columns = np.arange(len(token_ids)) - np.repeat(starts, seq_lengths) + 1
+        # The offsets of the sequences in the padded rows
+        if base_tokenizer.padding_side == "left":
+            offsets = width - lengths
+        else:
+            offsets = np.zeros(len(sequences), dtype=np.int64)
+
+        pad_token_id = base_tokenizer.pad_token_id
+        input_ids = np.full(
+            (len(sequences), width),
+            pad_token_id if pad_token_id is not None else 0,
+            dtype=np.int64,
+        )
+        input_ids[rows, columns + offsets[rows]] = token_ids
+        input_ids[np.arange(len(sequences)), offsets] = bos_id
+        input_ids[np.arange(len(sequences)), offsets + lengths - 1] = eos_id
+        positions = np.arange(width)
+        attention_mask = (positions >= offsets[:, None]) & (
+            positions < (offsets + lengths)[:, None]
+        )
+
+        if kwargs.get("warnings", True):
+            unk_ratios = (
+                np.bincount(
+                    rows,
+                    weights=token_ids == base_tokenizer.unk_token_id,
+                    minlength=len(sequences),
+                )
+                / lengths
+            )
+            for i in np.where(unk_ratios > 0.1)[0]:
+                warnings.warn(
+                    f"Unknown tokens are more than "
+                    f"{unk_ratios[i]}% in the {i}-th sequence, "
+                    f"please check the tokenization process."
+                )
+
+        return BatchEncoding(
+            {
+                "input_ids": torch.from_numpy(input_ids),
+                "attention_mask": torch.from_numpy(attention_mask.astype(np.int64)),
+            }
+        )
+
     @staticmethod
     def from_pretrained(model_name_or_path, **kwargs):
         self = OmniSingleNucleotideTokenizer(
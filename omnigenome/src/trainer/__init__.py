@@ -9,3 +9,4 @@
 
 from .hf_trainer import HFTrainer
 from .trainer import Trainer
+from .prefetcher import StructurePrefetcher
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# file: best_state.py
+# time: 16:30 18/10/2026
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# huggingface: https://huggingface.co/yangheng
+# google scholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# Copyright (C) 2019-2024. All Rights Reserved.
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+
+class BestStateTracker:
+    """
+    Keep a CPU snapshot of the best model state in memory, instead of moving the model to the
+    CPU and writing it to disk each time the validation metric improves. The snapshot buffers
+    are allocated once (in pinned memory for GPU models) and only the trainable parameters and
+    the buffers are copied again, as the frozen parameters never change. The snapshot can also
+    be written to disk in a background thread.
+    """
+
+    def __init__(self, model, path=None, async_write=True):
+        """
+        :param model: The model to track.
+        :param path: The file to write the best state to, None keeps it in memory only.
+        :param async_write: Whether to write the file in a background thread.
+        """
+        self.model = model
+        self.path = path
+        self.async_write = async_write
+        self.state = None
+        self._frozen_keys = set()
+        self._executor = None
+        self._pending_write = None
+
+    @property
+    def has_state(self):
+        return self.state is not None
+
+    def save(self):
+        # The snapshot must not change while it is being written
+        self._wait_for_write()
+
+        state_dict = self.model.state_dict(keep_vars=True)
+        copied = False
+        if self.state is None:
+            self.state = {}
+            for key, value in state_dict.items():
+                self.state[key] = torch.empty(
+                    value.shape,
+                    dtype=value.dtype,
+                    device="cpu",
+                    pin_memory=value.is_cuda and torch.cuda.is_available(),
+                )
+                if isinstance(value, torch.nn.Parameter) and not value.requires_grad:
+                    self._frozen_keys.add(key)
+            keys = state_dict.keys()
+        else:
+            # A parameter frozen at the first snapshot may have been unfrozen since then
+            self._frozen_keys = {
+                key for key in self._frozen_keys if not state_dict[key].requires_grad
+            }
+            keys = [key for key in state_dict.keys() if key not in self._frozen_keys]
+
+        for key in keys:
+            value = state_dict[key].detach()
+            self.state[key].copy_(value, non_blocking=value.is_cuda)
+            copied = copied or value.is_cuda
+        if copied:
+            torch.cuda.synchronize()
+
+        if self.path is not None:
+            if self.async_write:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1)
+                self._pending_write = self._executor.submit(
+                    torch.save, self.state, self.path
+                )
+            else:
+                torch.save(self.state, self.path)
+
+    def restore(self):
+        """
+        Load the best state back into the model, the tensors are copied to the model device.
+        """
+        if self.state is not None:
+            self.model.load_state_dict(self.state)
+        elif self.path is not None and os.path.exists(self.path):
+            self.model.load_state_dict(torch.load(self.path, map_location="cpu"))
+
+    def _wait_for_write(self):
+        if self._pending_write is not None:
+            self._pending_write.result()
+            self._pending_write = None
+
+    def close(self, remove_file=True):
+        """
+        Wait for the pending write, drop the snapshot and optionally remove the file.
+        """
+        self._wait_for_write()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.state = None
+        self._frozen_keys = set()
+        if remove_file and self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
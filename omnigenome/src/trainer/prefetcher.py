@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# file: prefetcher.py
+# time: 15:45 18/10/2026
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# huggingface: https://huggingface.co/yangheng
+# google scholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# Copyright (C) 2019-2024. All Rights Reserved.
+import queue
+import threading
+
+import torch
+
+from ..misc.utils import RNA2StructureCache
+
+
+class StructurePrefetcher:
+    """
+    Wrap a DataLoader to fold the sequences of the upcoming batches in a background thread,
+    while the model runs on the current batch. The structures are attached to each batch as
+    batch["structures"], which the *With2DStructure models use instead of decoding and
+    folding the batch in the forward pass.
+    """
+
+    _sentinel = object()
+
+    def __init__(self, data_loader, tokenizer, rna2structure=None, num_prefetch=2):
+        """
+        :param data_loader: The DataLoader of dict-like batches with input_ids.
+        :param tokenizer: The tokenizer used to decode the input_ids into sequences.
+        :param rna2structure: The RNA2StructureCache used to fold, e.g., shared with the model.
+        :param num_prefetch: The number of batches folded ahead of the current batch.
+        """
+        self.data_loader = data_loader
+        self.tokenizer = getattr(tokenizer, "base_tokenizer", tokenizer)
+        # The prefetcher only closes the structure cache it created itself
+        self._owns_rna2structure = rna2structure is None
+        self.rna2structure = (
+            rna2structure if rna2structure is not None else RNA2StructureCache()
+        )
+        self.num_prefetch = num_prefetch
+
+    def __len__(self):
+        return len(self.data_loader)
+
+    def close(self):
+        if self._owns_rna2structure:
+            self.rna2structure.close()
+
+    def fold_batch(self, batch):
+        sequences = self.tokenizer.batch_decode(
+            batch["input_ids"], skip_special_tokens=True
+        )
+        sequences = [seq.replace(" ", "") for seq in sequences]
+        structures = self.rna2structure.fold(sequences)
+        batch["structures"] = [structures] if isinstance(structures, str) else structures
+        return batch
+
+    def _produce(self, batches, stop_event):
+        try:
+            for batch in self.data_loader:
+                batch = self.fold_batch(batch)
+                while not stop_event.is_set():
+                    try:
+                        batches.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop_event.is_set():
+                    return
+        except Exception as e:
+            batches.put(e)
+        batches.put(self._sentinel)
+
+    def __iter__(self):
+        batches = queue.Queue(maxsize=max(self.num_prefetch, 1))
+        stop_event = threading.Event()
+        producer = threading.Thread(
+            target=self._produce, args=(batches, stop_event), daemon=True
+        )
+        producer.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is self._sentinel:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            # Stop the producer if the iteration is interrupted, e.g., by early stopping
+            stop_event.set()
+            while producer.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+
+class DevicePrefetcher:
+    """
+    Wrap a DataLoader to copy the next batch to the device with non_blocking=True on a side
+    CUDA stream, while the model runs on the current batch. The copies only overlap with the
+    computation for the batches in pinned memory, i.e., DataLoader(pin_memory=True). The
+    batches are passed through unchanged on CPU.
+    """
+
+    def __init__(self, data_loader, device):
+        """
+        :param data_loader: The DataLoader of batches with a to(device, non_blocking) method.
+        :param device: The device to copy the batches to.
+        """
+        self.data_loader = data_loader
+        self.device = torch.device(device)
+
+    def __len__(self):
+        return len(self.data_loader)
+
+    def __getattr__(self, item):
+        # Expose the attributes of the wrapped loader, e.g., the dataset
+        if item == "data_loader":
+            raise AttributeError(item)
+        return getattr(self.data_loader, item)
+
+    def _copy(self, batch, stream):
+        with torch.cuda.stream(stream):
+            return batch.to(self.device, non_blocking=True)
+
+    def __iter__(self):
+        if self.device.type != "cuda" or not torch.cuda.is_available():
+            yield from self.data_loader
+            return
+
+        stream = torch.cuda.Stream(device=self.device)
+        batches = iter(self.data_loader)
+        next_batch = next(batches, None)
+        if next_batch is not None:
+            next_batch = self._copy(next_batch, stream)
+        while next_batch is not None:
+            torch.cuda.current_stream(self.device).wait_stream(stream)
+            batch = next_batch
+            for value in batch.values():
+                # The memory allocated on the side stream must not be reused
+                # before the main stream is done with the batch
+                if isinstance(value, torch.Tensor) and value.is_cuda:
+                    value.record_stream(torch.cuda.current_stream(self.device))
+            next_batch = next(batches, None)
+            if next_batch is not None:
+                next_batch = self._copy(next_batch, stream)
+            yield batch
@@ -7,15 +7,28 @@
 # google scholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
 # Copyright (C) 2019-2024. All Rights Reserved.
 import os
+import tempfile
+from contextlib import nullcontext
 
 import autocuda
 import numpy as np
-from torch.utils.data import DataLoader
+from torch.utils.data import (
+    BatchSampler,
+    DataLoader,
+    DistributedSampler,
+    IterableDataset,
+    RandomSampler,
+    SequentialSampler,
+)
 from tqdm import tqdm
-from ..misc.utils import env_meta_info, fprint, seed_everything
+from ..abc.abstract_dataset import LengthGroupedSampler
+from ..metric.streaming_metric import StreamingMetric
+from ..misc.utils import RNA2StructureCache, env_meta_info, fprint, seed_everything
+from .best_state import BestStateTracker
+from .prefetcher import DevicePrefetcher, StructurePrefetcher
 
 import torch
-from torch.cuda.amp import GradScaler
+from torch.distributed.algorithms import Join
 
 
 def _infer_optimization_direction(metrics, prev_metrics):
@@ -69,6 +82,136 @@ def _infer_optimization_direction(metrics, prev_metrics):
         return "smaller_is_better"
 
 
+def _has_batches(data_loader):
+    if data_loader is None:
+        return False
+    try:
+        if torch.distributed.is_available() and torch.distributed.is_initialized():
+            # The shard of a process may be empty, all processes must take the same branch
+            while hasattr(data_loader, "data_loader"):
+                data_loader = data_loader.data_loader
+            return len(data_loader.dataset) > 0
+        return len(data_loader) > 0
+    except TypeError:
+        # The length of a DataLoader over an IterableDataset is unknown
+        return True
+
+
+def _to_numpy(tensor):
+    # NumPy has no bfloat16, e.g., the regression outputs under the bfloat16 autocast
+    if tensor.dtype == torch.bfloat16:
+        tensor = tensor.float()
+    return tensor.cpu().numpy(force=True)
+
+
+def _concatenate(arrays, padding_value=-100):
+    # Dynamically padded batches of token-level outputs differ in length,
+    # pad them to a common length before the concatenation
+    if any(array.shape[1:] != arrays[0].shape[1:] for array in arrays):
+        length = max([array.shape[1] for array in arrays])
+        arrays = [
+            np.pad(
+                array,
+                [(0, 0), (0, length - array.shape[1])] + [(0, 0)] * (array.ndim - 2),
+                constant_values=padding_value,
+            )
+            for array in arrays
+        ]
+    return np.concatenate(arrays)
+
+
+def _set_epoch(data_loader, epoch):
+    # Reshuffle the distributed samplers, the loader may be wrapped by the prefetchers
+    while hasattr(data_loader, "data_loader"):
+        data_loader = data_loader.data_loader
+    for sampler in [
+        getattr(data_loader, "sampler", None),
+        getattr(getattr(data_loader, "batch_sampler", None), "sampler", None),
+        getattr(data_loader, "batch_sampler", None),
+    ]:
+        if hasattr(sampler, "set_epoch"):
+            sampler.set_epoch(epoch)
+
+
+def _build_data_loader(
+    dataset,
+    batch_size,
+    shuffle=False,
+    group_by_length=False,
+    num_replicas=1,
+    rank=0,
+    seed=0,
+    **loader_kwargs,
+):
+    if dataset is None:
+        return None
+    # The worker options are only accepted by DataLoader with worker processes
+    if not loader_kwargs.get("num_workers"):
+        loader_kwargs.pop("persistent_workers", None)
+        loader_kwargs.pop("prefetch_factor", None)
+    loader_kwargs = {
+        key: value for key, value in loader_kwargs.items() if value is not None
+    }
+    # The dynamically padded datasets provide a collator padding each batch on its own
+    collate_fn = getattr(dataset, "data_collator", None)
+    if isinstance(dataset, IterableDataset):
+        return DataLoader(
+            dataset, batch_size=batch_size, collate_fn=collate_fn, **loader_kwargs
+        )
+
+    if group_by_length and hasattr(dataset, "get_sequence_lengths"):
+        batch_sampler = LengthGroupedSampler(
+            dataset.get_sequence_lengths(),
+            batch_size,
+            shuffle=shuffle,
+            num_replicas=num_replicas,
+            rank=rank,
+            seed=seed if num_replicas > 1 else None,
+        )
+    elif num_replicas > 1:
+        if shuffle:
+            sampler = DistributedSampler(
+                dataset, num_replicas=num_replicas, rank=rank, shuffle=True, seed=seed
+            )
+        else:
+            # Every example is evaluated exactly once, without the padding of DistributedSampler
+            sampler = range(rank, len(dataset), num_replicas)
+        batch_sampler = BatchSampler(sampler, batch_size=batch_size, drop_last=False)
+    else:
+        sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+        batch_sampler = BatchSampler(sampler, batch_size=batch_size, drop_last=False)
+
+    if getattr(dataset, "columnar", False):
+        # Columnar datasets are indexed with the whole list of batch indices,
+        # so each batch is sliced from the columns instead of collated sample by sample
+        return DataLoader(
+            dataset, sampler=batch_sampler, batch_size=None, **loader_kwargs
+        )
+    return DataLoader(
+        dataset, batch_sampler=batch_sampler, collate_fn=collate_fn, **loader_kwargs
+    )
+
+
+def _distributed_worker(local_rank, trainer, state_dict_path, path_to_save, kwargs):
+    trainer._init_distributed(
+        trainer.node_rank * trainer.num_processes + local_rank,
+        trainer.num_nodes * trainer.num_processes,
+        init_method=f"tcp://{trainer.master_addr}:{trainer.master_port}",
+    )
+    try:
+        metrics = trainer.train(path_to_save, **kwargs)
+        # The metrics and the weights are the same in all processes, the first process of
+        # each node hands them over to the launching process through a file, which (unlike
+        # a pipe) cannot block the worker while the launching process joins it
+        if local_rank == 0:
+            torch.save(
+                {"state_dict": trainer.model.state_dict(), "metrics": metrics},
+                state_dict_path,
+            )
+    finally:
+        torch.distributed.destroy_process_group()
+
+
 class Trainer:
     def __init__(
         self,
@@ -89,15 +232,54 @@ class Trainer:
         **kwargs,
     ):
         self.model = model
+        self.device = device if device else autocuda.auto_cuda()
+        self.device_type = torch.device(self.device).type
+        self.seed = seed
+        self.rank = 0
+        self.world_size = 1
+        self._ddp_model = None
         # DataLoaders
         if kwargs.get("train_loader"):
+            self._loader_config = None
             self.train_loader = kwargs.get("train_loader", None)
             self.eval_loader = kwargs.get("eval_loader", None)
             self.test_loader = kwargs.get("test_loader", None)
         else:
-            self.train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-            self.eval_loader = DataLoader(eval_dataset, batch_size=batch_size) if eval_dataset else None
-            self.test_loader = DataLoader(test_dataset, batch_size=batch_size) if test_dataset else None
+            self._loader_config = {
+                "datasets": [train_dataset, eval_dataset, test_dataset],
+                "batch_size": batch_size,
+                "eval_batch_size": kwargs.get("eval_batch_size", None) or batch_size,
+                "group_by_length": kwargs.get("group_by_length", False),
+                "loader_kwargs": {
+                    "num_workers": kwargs.get("dataloader_num_workers", 0),
+                    # Pinned batches can be copied to the GPU asynchronously
+                    "pin_memory": (
+                        kwargs.get("pin_memory")
+                        if kwargs.get("pin_memory") is not None
+                        else self.device_type == "cuda"
+                    ),
+                    "persistent_workers": kwargs.get("persistent_workers", None),
+                    "prefetch_factor": kwargs.get("prefetch_factor", None),
+                },
+            }
+            self._build_data_loaders()
+        self._wrap_data_loaders(
+            prefetch_structures=kwargs.get("prefetch_structures", False),
+            prefetch_to_device=kwargs.get("prefetch_to_device", True),
+        )
+
+        # Distributed data-parallel training, e.g., over the cores of CPU nodes
+        self.num_processes = kwargs.get("num_processes", 1)
+        self.num_nodes = kwargs.get("num_nodes", 1)
+        self.node_rank = kwargs.get("node_rank", 0)
+        self.master_addr = kwargs.get("master_addr", "127.0.0.1")
+        self.master_port = kwargs.get("master_port", 29500)
+        self.backend = kwargs.get("backend", "gloo")
+        self.start_method = kwargs.get("start_method", "fork")
+        self.find_unused_parameters = kwargs.get("find_unused_parameters", True)
+        # Join the process group set up by an external launcher, e.g., torchrun
+        self.distributed = kwargs.get("distributed", False)
+        self._num_threads = kwargs.get("num_threads", None)
 
         self.epochs = epochs
         self.patience = patience
@@ -107,8 +289,6 @@ class Trainer:
         self.compute_metrics = (
             compute_metrics if isinstance(compute_metrics, list) else [compute_metrics]
         )
-        self.seed = seed
-        self.device = device if device else autocuda.auto_cuda()
         self.fast_dtype = {
             "float32": torch.float32,
             "fp32": torch.float32,
@@ -117,7 +297,23 @@ class Trainer:
             "bfloat16": torch.bfloat16,
             "bf16": torch.bfloat16,
         }.get(autocast, torch.float16)
-        self.scaler = GradScaler()
+        if self.device_type == "cpu" and self.fast_dtype == torch.float16:
+            # The float16 autocast only ever applied to CUDA, CPU training stays in float32
+            # unless the bfloat16 autocast is requested explicitly
+            fprint(
+                "The float16 autocast is not used on CPU, training in float32. "
+                "Pass autocast='bf16' to autocast to bfloat16 on CPU."
+            )
+            self.fast_dtype = torch.float32
+        # The gradients only need to be scaled for the float16 autocast on GPU
+        self.scaler = torch.amp.GradScaler(
+            self.device_type,
+            enabled=self.device_type == "cuda" and self.fast_dtype == torch.float16,
+        )
+        if self.device_type == "cpu":
+            self._set_cpu_threads(
+                kwargs.get("num_threads", None), kwargs.get("num_interop_threads", None)
+            )
         if self.loss_fn is not None:
             self.model.set_loss_fn(self.loss_fn)
 
@@ -129,6 +325,160 @@ class Trainer:
         self._optimization_direction = None
         self.trial_name = kwargs.get("trial_name", self.model.__class__.__name__)
 
+        # The best state is kept in memory, writing it to disk is optional
+        self._best_state = BestStateTracker(
+            self.model,
+            path=(
+                self._get_state_dict_path()
+                if kwargs.get("save_best_state_to_disk", False)
+                else None
+            ),
+            async_write=kwargs.get("async_save", True),
+        )
+
+    def _build_data_loaders(self):
+        config = self._loader_config
+        train_dataset, eval_dataset, test_dataset = config["datasets"]
+        distributed_kwargs = {
+            "num_replicas": self.world_size,
+            "rank": self.rank,
+            "seed": self.seed,
+        }
+        self.train_loader = _build_data_loader(
+            train_dataset,
+            config["batch_size"],
+            shuffle=True,
+            group_by_length=config["group_by_length"],
+            **distributed_kwargs,
+            **config["loader_kwargs"],
+        )
+        self.eval_loader = _build_data_loader(
+            eval_dataset,
+            config["eval_batch_size"],
+            group_by_length=config["group_by_length"],
+            **distributed_kwargs,
+            **config["loader_kwargs"],
+        )
+        self.test_loader = _build_data_loader(
+            test_dataset,
+            config["eval_batch_size"],
+            group_by_length=config["group_by_length"],
+            **distributed_kwargs,
+            **config["loader_kwargs"],
+        )
+
+    def _wrap_data_loaders(self, prefetch_structures=False, prefetch_to_device=True):
+        self._prefetch_options = {
+            "prefetch_structures": prefetch_structures,
+            "prefetch_to_device": prefetch_to_device,
+        }
+        model = self.model
+        if prefetch_structures and "2DStructure" in getattr(
+            model, "metadata", {}
+        ).get("model_name", ""):
+            # Fold the structures of the upcoming batches in the background,
+            # sharing the structure cache of the model
+            if not hasattr(model.model, "rna2structure"):
+                model.model.rna2structure = RNA2StructureCache()
+            self.train_loader, self.eval_loader, self.test_loader = [
+                StructurePrefetcher(
+                    data_loader, model.tokenizer, model.model.rna2structure
+                )
+                if data_loader is not None
+                else None
+                for data_loader in [self.train_loader, self.eval_loader, self.test_loader]
+            ]
+
+        if prefetch_to_device and self.device_type == "cuda":
+            # Copy the next batch to the GPU while the model runs on the current batch
+            self.train_loader, self.eval_loader, self.test_loader = [
+                DevicePrefetcher(data_loader, self.device)
+                if data_loader is not None
+                else None
+                for data_loader in [self.train_loader, self.eval_loader, self.test_loader]
+            ]
+
+    def _init_distributed(self, rank, world_size, init_method="env://"):
+        """
+        Join the process group and shard the data across the processes, the gradients of
+        the model are all-reduced by DistributedDataParallel.
+        :param rank: The global rank of this process.
+        :param world_size: The number of processes over all nodes.
+        :param init_method: The URL to initialize the process group, e.g., tcp://host:port.
+        """
+        if self._loader_config is None:
+            raise ValueError(
+                "The distributed training builds the DataLoaders with the distributed samplers, "
+                "please pass the datasets instead of the DataLoaders to the Trainer."
+            )
+        if not torch.distributed.is_initialized():
+            torch.distributed.init_process_group(
+                self.backend,
+                init_method=init_method,
+                rank=rank,
+                world_size=world_size,
+            )
+        self.rank = torch.distributed.get_rank()
+        self.world_size = torch.distributed.get_world_size()
+        if self.device_type == "cpu":
+            # Split the cores of the node over its processes instead of oversubscribing them
+            local_world_size = int(
+                os.environ.get("LOCAL_WORLD_SIZE", self.num_processes)
+            )
+            self._set_cpu_threads(
+                self._num_threads or max(1, (os.cpu_count() or 1) // local_world_size)
+            )
+
+        self._build_data_loaders()
+        self._wrap_data_loaders(**self._prefetch_options)
+        self._ddp_model = torch.nn.parallel.DistributedDataParallel(
+            self.model, find_unused_parameters=self.find_unused_parameters
+        )
+        if self.rank != 0:
+            # Only the first process writes the checkpoints
+            self._best_state.path = None
+
+    def _launch_distributed(self, path_to_save=None, **kwargs):
+        state_dict_path = os.path.join(
+            tempfile.mkdtemp(), self._get_state_dict_path()
+        )
+        torch.multiprocessing.start_processes(
+            _distributed_worker,
+            args=(self, state_dict_path, path_to_save, kwargs),
+            nprocs=self.num_processes,
+            start_method=self.start_method,
+        )
+        # Load the trained model of the first process in this process
+        # The file is written by the worker processes, it holds the metrics besides the weights
+        outputs = torch.load(state_dict_path, weights_only=False)
+        self.metrics = outputs["metrics"]
+        self.model.load_state_dict(outputs["state_dict"])
+        os.remove(state_dict_path)
+        os.rmdir(os.path.dirname(state_dict_path))
+        return self.metrics
+
+    @staticmethod
+    def _set_cpu_threads(num_threads=None, num_interop_threads=None):
+        """
+        :param num_threads: The number of intra-op threads, None keeps the default of torch.
+        :param num_interop_threads: The number of inter-op threads, only settable once.
+        """
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+        if num_interop_threads is not None:
+            try:
+                torch.set_num_interop_threads(num_interop_threads)
+            except RuntimeError as e:
+                fprint(f"Cannot set the number of inter-op threads due to {e}")
+
+    def _autocast(self):
+        # Autocast on the device of the model, disabled for float32
+        return torch.autocast(
+            device_type=self.device_type,
+            dtype=self.fast_dtype,
+            enabled=self.fast_dtype != torch.float32,
+        )
+
     def _is_metric_better(self, metrics, stage="valid"):
         assert stage in [
             "valid",
@@ -170,10 +520,21 @@ class Trainer:
         return False
 
     def train(self, path_to_save=None, **kwargs):
+        if self._ddp_model is None:
+            if self.num_processes * self.num_nodes > 1:
+                return self._launch_distributed(path_to_save, **kwargs)
+            if self.distributed:
+                self._init_distributed(
+                    int(os.environ.get("RANK", 0)), int(os.environ.get("WORLD_SIZE", 1))
+                )
+        # The forward and backward passes go through DistributedDataParallel to all-reduce
+        # the gradients, while the evaluation uses the model itself
+        train_model = self._ddp_model if self._ddp_model is not None else self.model
+
         seed_everything(self.seed)
         patience = 0
 
-        if self.eval_loader is not None and len(self.eval_loader) > 0:
+        if _has_batches(self.eval_loader):
             valid_metrics = self.evaluate()
         else:
             valid_metrics = self.test()
@@ -183,45 +544,52 @@ class Trainer:
 
         for epoch in range(self.epochs):
             self.model.train()
+            _set_epoch(self.train_loader, epoch)
             train_loss = []
             train_it = tqdm(
-                self.train_loader, desc=f"Epoch {epoch + 1}/{self.epochs} Loss:"
+                self.train_loader,
+                desc=f"Epoch {epoch + 1}/{self.epochs} Loss:",
+                disable=self.rank != 0,
+            )
+            # The processes may get different numbers of batches, e.g., from the iterable
+            # datasets, Join keeps the gradient all-reduce of the remaining processes going
+            join_context = (
+                Join([self._ddp_model])
+                if self._ddp_model is not None
+                else nullcontext()
             )
 
-            for step, batch in enumerate(train_it):
-                batch = batch.to(self.device)
+            with join_context:
+                for step, batch in enumerate(train_it):
+                    batch = batch.to(self.device)
 
-                if step % self.gradient_accumulation_steps == 0:
-                    self.optimizer.zero_grad()
+                    if step % self.gradient_accumulation_steps == 0:
+                        self.optimizer.zero_grad()
 
-                if self.fast_dtype:
-                    with torch.autocast(device_type="cuda", dtype=self.fast_dtype):
-                        loss = self.model(batch)["loss"]
-                else:
-                    loss = self.model(batch)["loss"]
+                    with self._autocast():
+                        loss = train_model(batch)["loss"]
 
-                loss = loss / self.gradient_accumulation_steps
+                    loss = loss / self.gradient_accumulation_steps
 
-                if self.fast_dtype:
+                    # The scaler passes the loss and the steps through when it is disabled
                     self.scaler.scale(loss).backward()
-                else:
-                    loss.backward()
 
-                if (step + 1) % self.gradient_accumulation_steps == 0 or (
-                    step + 1
-                ) == len(self.train_loader):
-                    if self.fast_dtype:
+                    if (step + 1) % self.gradient_accumulation_steps == 0:
                         self.scaler.step(self.optimizer)
                         self.scaler.update()
-                    else:
-                        self.optimizer.step()
 
-                train_loss.append(loss.item() * self.gradient_accumulation_steps)
-                train_it.set_description(
-                    f"Epoch {epoch + 1}/{self.epochs} Loss: {np.nanmean(train_loss):.4f}"
-                )
+                    train_loss.append(loss.item() * self.gradient_accumulation_steps)
+                    train_it.set_description(
+                        f"Epoch {epoch + 1}/{self.epochs} Loss: {np.nanmean(train_loss):.4f}"
+                    )
+
+            # Apply the gradients left over from an incomplete accumulation window,
+            # the number of steps is not known in advance for iterable datasets
+            if train_loss and len(train_loss) % self.gradient_accumulation_steps != 0:
+                self.scaler.step(self.optimizer)
+                self.scaler.update()
 
-            if self.eval_loader is not None and len(self.eval_loader) > 0:
+            if _has_batches(self.eval_loader):
                 valid_metrics = self.evaluate()
             else:
                 valid_metrics = self.test()
@@ -235,7 +603,7 @@ class Trainer:
                     print(f"Early stopping at epoch {epoch + 1}.")
                     break
 
-            if path_to_save:
+            if path_to_save and self.rank == 0:
                 _path_to_save = path_to_save + "_epoch_" + str(epoch + 1)
 
                 if valid_metrics:
@@ -244,12 +612,12 @@ class Trainer:
 
                 self.save_model(_path_to_save, **kwargs)
 
-        if self.test_loader is not None and len(self.test_loader) > 0:
+        if _has_batches(self.test_loader):
             self._load_state_dict()
             test_metrics = self.test()
             self._is_metric_better(test_metrics, stage="test")
 
-        if path_to_save:
+        if path_to_save and self.rank == 0:
             _path_to_save = path_to_save + "_final"
             if self.metrics["test"]:
                 for key, value in self.metrics["test"][-1].items():
@@ -258,57 +626,76 @@ class Trainer:
             self.save_model(_path_to_save, **kwargs)
 
         self._remove_state_dict()
+        self._close_structure_caches()
 
         return self.metrics
 
     def evaluate(self):
-        valid_metrics = {}
-        with torch.no_grad():
-            self.model.eval()
-            val_truth = []
-            val_preds = []
-            it = tqdm(self.eval_loader, desc="Evaluating")
-            for batch in it:
-                batch.to(self.device)
-                labels = batch['labels']
-                batch.pop('labels')
-                if self.fast_dtype:
-                    with torch.autocast(device_type="cuda", dtype=self.fast_dtype):
-                        predictions = self.model.predict(batch)["predictions"]
-                else:
-                    predictions = self.model.predict(batch)["predictions"]
-                val_truth.append(labels.cpu().numpy(force=True))
-                val_preds.append(predictions.cpu().numpy(force=True))
-
-            val_truth = np.concatenate(val_truth)
-            val_preds = np.concatenate(val_preds)
-            for metric_func in self.compute_metrics:
-                valid_metrics.update(metric_func(val_truth, val_preds))
-            return valid_metrics
+        return self._compute_loader_metrics(self.eval_loader, desc="Evaluating")
 
     def test(self):
-        test_metrics = {}
+        return self._compute_loader_metrics(self.test_loader, desc="Testing")
+
+    def _compute_loader_metrics(self, data_loader, desc):
+        metrics = {}
+        # The streaming metrics are updated batch by batch on the device, the labels and
+        # predictions are only collected for the other metric functions
+        streaming_metrics = [
+            metric_func
+            for metric_func in self.compute_metrics
+            if isinstance(metric_func, StreamingMetric)
+        ]
+        metric_funcs = [
+            metric_func
+            for metric_func in self.compute_metrics
+            if not isinstance(metric_func, StreamingMetric)
+        ]
+        for metric_func in streaming_metrics:
+            metric_func.reset()
         with torch.no_grad():
             self.model.eval()
-            preds = []
             truth = []
-            it = tqdm(self.test_loader, desc="Testing")
+            preds = []
+            it = tqdm(data_loader, desc=desc, disable=self.rank != 0)
             for batch in it:
                 batch.to(self.device)
                 labels = batch['labels']
                 batch.pop('labels')
-                if self.fast_dtype:
-                    with torch.autocast(device_type="cuda", dtype=self.fast_dtype):
-                        predictions = self.model.predict(batch)["predictions"]
-                else:
+                with self._autocast():
                     predictions = self.model.predict(batch)["predictions"]
-                truth.append(labels.cpu().numpy(force=True))
-                preds.append(predictions.cpu().numpy(force=True))
-            preds = np.concatenate(preds)
-            truth = np.concatenate(truth)
-            for metric_func in self.compute_metrics:
-                test_metrics.update(metric_func(truth, preds))
-            return test_metrics
+                for metric_func in streaming_metrics:
+                    metric_func.update(labels, predictions)
+                if metric_funcs:
+                    truth.append(labels.cpu().numpy(force=True))
+                    preds.append(_to_numpy(predictions))
+
+            for metric_func in streaming_metrics:
+                # Only the final statistics are meant to reach the host
+                device = metric_func.device
+                if device is not None and device.type != self.device_type:
+                    fprint(
+                        f"The statistics of {metric_func.__class__.__name__} are on {device} "
+                        f"instead of {self.device}, each batch is copied to the host."
+                    )
+
+            if self.world_size > 1:
+                # Gather the statistics or the outputs of the shards of all processes
+                for metric_func in streaming_metrics:
+                    metric_func.all_reduce()
+                if metric_funcs:
+                    outputs = [None] * self.world_size
+                    torch.distributed.all_gather_object(outputs, (truth, preds))
+                    truth = [array for _truth, _ in outputs for array in _truth]
+                    preds = [array for _, _preds in outputs for array in _preds]
+
+            for metric_func in streaming_metrics:
+                metrics.update(metric_func.compute())
+            if metric_funcs:
+                truth = _concatenate(truth)
+                preds = _concatenate(preds)
+                for metric_func in metric_funcs:
+                    metrics.update(metric_func(truth, preds))
+            return metrics
 
     def predict(self, data_loader):
         return self.model.predict(data_loader)
@@ -325,33 +712,31 @@ class Trainer:
     def save_model(self, path, overwrite=False, **kwargs):
         self.model.save(path, overwrite, **kwargs)
 
-    def _load_state_dict(self):
-        if os.path.exists(self._model_state_dict_path):
-            self.model.load_state_dict(torch.load(self._model_state_dict_path))
-        self.model.to(self.device)
-
-    def _save_state_dict(self):
+    def _close_structure_caches(self):
+        # Release the folding workers of the structure prefetchers and the model
+        for data_loader in [self.train_loader, self.eval_loader, self.test_loader]:
+            if isinstance(data_loader, DevicePrefetcher):
+                data_loader = data_loader.data_loader
+            if isinstance(data_loader, StructurePrefetcher):
+                data_loader.close()
+        if hasattr(self.model, "close"):
+            self.model.close()
+
+    def _get_state_dict_path(self):
         if not hasattr(self, "_model_state_dict_path"):
             from hashlib import sha256
 
             self._model_state_dict_path = (
                 sha256(self.__repr__().encode()).hexdigest() + "_model_state_dict.pt"
             )
+        return self._model_state_dict_path
 
-        if os.path.exists(self._model_state_dict_path):
-            os.remove(self._model_state_dict_path)
-
-        self.model.to("cpu")
-        torch.save(self.model.state_dict(), self._model_state_dict_path)
+    def _load_state_dict(self):
+        self._best_state.restore()
         self.model.to(self.device)
 
-    def _remove_state_dict(self):
-        if not hasattr(self, "_model_state_dict_path"):
-            from hashlib import sha256
-
-            self._model_state_dict_path = (
-                sha256(self.__repr__().encode()).hexdigest() + "_model_state_dict.pt"
-            )
+    def _save_state_dict(self):
+        self._best_state.save()
 
-        if os.path.exists(self._model_state_dict_path):
-            os.remove(self._model_state_dict_path)
+    def _remove_state_dict(self):
+        self._best_state.close(remove_file=True)